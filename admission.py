@@ -0,0 +1,123 @@
+import os
+import re
+import math
+from dataclasses import dataclass, field
+
+# Load custom modules
+import ledger
+import remote
+
+GB = 1024 ** 3
+
+# Host memory of the simulation at every statistics dump, in bytes
+HOST_MEMORY_RE = re.compile(r'^hostMemory\s+(\S+)', re.MULTILINE)
+
+
+def host_memory(cpt_dir: str) -> int | None:
+    """Peak host memory gem5 reported in the stats.txt of a checkpoint, None if not reported"""
+    for path in (os.path.join(cpt_dir, "m5out", "stats.txt"), os.path.join(cpt_dir, "stats.txt")):
+        if os.path.isfile(path):
+            with open(path, "r", errors="replace") as f:
+                values = HOST_MEMORY_RE.findall(f.read())
+            try:
+                peak = max((int(float(v)) for v in values), default=0)
+            except ValueError:
+                return None
+            return peak if peak > 0 else None
+    return None
+
+
+@dataclass
+class Limits:
+    """
+    Class to hold the admission limits of the servers
+    """
+    max_proc_per_server: int
+    # memory of a job in bytes until the ledger holds a measured one, 0 without memory admission
+    job_mem: int
+    # memory in bytes every server keeps free
+    mem_reserve: int
+    # server -> config.ServerConfig with its overrides
+    servers: dict = field(default_factory=dict)
+
+    def _override(self, server: str, name: str):
+        overrides = self.servers.get(server)
+        return getattr(overrides, name) if overrides is not None else None
+
+    def max_proc(self, server: str) -> int:
+        value = self._override(server, "max_proc")
+        return self.max_proc_per_server if value is None else value
+
+    def cores(self, server: str, probed: int) -> int:
+        value = self._override(server, "cores")
+        return probed if value is None else value
+
+    def reserve(self, server: str) -> int:
+        value = self._override(server, "mem_reserve_gb")
+        return self.mem_reserve if value is None else int(value * GB)
+
+
+# Limits every dispatcher admits jobs with, see configure
+LIMITS: Limits | None = None
+
+
+def limits_of(run) -> Limits:
+    """Admission limits of a config.RunningConfig"""
+    return Limits(
+        max_proc_per_server=run.max_proc_per_server,
+        job_mem=int(run.job_mem_gb * GB) if run.job_mem_gb is not None else 0,
+        mem_reserve=int(run.mem_reserve_gb * GB),
+        servers=run.servers,
+    )
+
+
+def configure(run) -> Limits:
+    """Set LIMITS from a config.RunningConfig"""
+    global LIMITS
+    LIMITS = limits_of(run)
+    return LIMITS
+
+
+def enabled() -> bool:
+    """True if jobs are admitted by memory, i.e. running.job_mem_gb is set"""
+    return LIMITS is not None and LIMITS.job_mem > 0
+
+
+def estimate(jobs):
+    """
+    Set the memory expected of every one of [jobs].
+
+    Taken from the peak memory the ledger recorded for completed jobs of the
+    same configuration, else of the same workload under any configuration,
+    else LIMITS.job_mem. Left at 0 without memory admission.
+
+    Args:
+        jobs: dispatch.Jobs about to be launched, their mem is set in place
+    """
+    if not enabled():
+        return
+    # (config, workload) -> bytes, looked up once per round
+    known: dict[tuple[str, str], int] = {}
+    for job in jobs:
+        key = (job.arch_name, job.workload_name)
+        if key not in known:
+            peak = ledger.LEDGER.peak_rss(*key) if ledger.LEDGER is not None else None
+            known[key] = peak or LIMITS.job_mem
+        job.mem = known[key]
+
+
+def free_memory(status: remote.ServerStatus, growth: int, reserve: int) -> float:
+    """
+    Memory the new jobs of a server may take.
+
+    Args:
+        status: Result of remote.probe_server with the PIDs of our jobs
+        growth: Memory our jobs on the server are still expected to take, in bytes
+        reserve: Memory to keep free in bytes
+
+    Returns:
+        Bytes, unbounded if the free memory of the server is unknown
+    """
+    if status.mem_available <= 0:
+        return math.inf
+    return max(0, status.mem_available - reserve - growth)
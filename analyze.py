@@ -0,0 +1,351 @@
+import os
+import re
+import csv
+import sys
+import json
+import pickle
+import argparse
+import numpy as np
+
+# Load custom modules, config is only imported with --config since it pulls in skopt
+import journal
+
+# Columns every history has, the others are tuned params
+BASE_COLUMNS = ("campaign", "id", "score", "rung")
+
+# <column><op><value>, e.g. l1d-pht-entries>=256 or --pht-pf-level=2
+WHERE_RE = re.compile(r'^(.+?)(<=|>=|!=|==|=|<|>)(.*)$')
+
+OPS = {
+    "=": np.equal, "==": np.equal, "!=": np.not_equal,
+    "<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal,
+}
+
+
+def read_history(path: str) -> tuple[list[list], list[float], list[dict]]:
+    """
+    Read the evaluations of one campaign.
+
+    Args:
+        path: Output directory of the campaign, its optimize_journal.jsonl,
+              or an older optimize_checkpoint.pkl / optimize_result.pkl
+
+    Returns:
+        Points, objective values and the raw journal records (empty for pickles)
+
+    Raises:
+        FileNotFoundError: If [path] holds no history
+    """
+    if os.path.isdir(path):
+        candidates = [os.path.join(path, name) for name in
+                      ("optimize_journal.jsonl", "optimize_checkpoint.pkl", "optimize_result.pkl")]
+        found = [candidate for candidate in candidates if os.path.exists(candidate)]
+        if not found:
+            raise FileNotFoundError(f"No optimize_journal.jsonl or optimize_*.pkl in {path}")
+        path = found[0]
+    elif not os.path.exists(path):
+        raise FileNotFoundError(f"No such history: {path}")
+
+    if path.endswith(".jsonl"):
+        records = list(journal.Journal(path).read())
+        return [r["x"] for r in records], [r["y"] for r in records], records
+
+    with open(path, "rb") as f:
+        checkpoint = pickle.load(f)
+    if isinstance(checkpoint, dict):
+        return list(checkpoint["params"]), list(checkpoint["score"]), []
+    # OptimizeResult
+    return list(checkpoint.x_iters), list(checkpoint.func_vals), []
+
+
+def to_column(values: list) -> np.ndarray:
+    """Numeric column when every value is a number, string column otherwise"""
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in values):
+        return np.array(values, dtype=np.int64)
+    if all(isinstance(v, (int, float, np.number)) and not isinstance(v, bool) for v in values):
+        return np.array(values, dtype=float)
+    return np.array(["" if v is None else str(v) for v in values])
+
+
+def load_campaign(path: str, label: str, param_names: list[str] | None = None) -> dict[str, np.ndarray]:
+    """
+    Load a campaign into columns.
+
+    Args:
+        path: See read_history
+        label: Campaign name stored in the campaign column
+        param_names: Names of the tuned params, for histories without them
+
+    Returns:
+        Column name -> array, one row per evaluation
+    """
+    x_iters, func_vals, records = read_history(path)
+    n = len(x_iters)
+
+    rows = []
+    for i, x in enumerate(x_iters):
+        if i < len(records) and "params" in records[i]:
+            rows.append(records[i]["params"])
+        else:
+            names = param_names or [f"p{j}" for j in range(len(x))]
+            rows.append(dict(zip(names, x)))
+
+    names = []
+    for row in rows:
+        names += [name for name in row if name not in names]
+
+    columns = {
+        "campaign": np.full(n, label),
+        "id": np.arange(n),
+        "score": -np.array(func_vals, dtype=float),
+        "rung": np.array([r.get("rung", 0) for r in records] if records else [0] * n, dtype=int),
+    }
+    for name in names:
+        columns[name] = to_column([row.get(name) for row in rows])
+    return columns
+
+
+def concat(tables: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    """Stack campaigns, a param missing from a campaign is an empty string there"""
+    names = []
+    for table in tables:
+        names += [name for name in table if name not in names]
+
+    columns = {}
+    for name in names:
+        parts = [table.get(name) for table in tables]
+        if all(p is not None and p.dtype.kind in "fi" for p in parts):
+            columns[name] = np.concatenate(parts)
+        else:
+            columns[name] = np.concatenate([
+                p.astype(str) if p is not None else np.full(len(t["id"]), "")
+                for p, t in zip(parts, tables)
+            ])
+    return columns
+
+
+def param_columns(table: dict[str, np.ndarray]) -> list[str]:
+    return [name for name in table if name not in BASE_COLUMNS]
+
+
+def resolve(table: dict[str, np.ndarray], name: str) -> str:
+    """Column of [name], the leading '--' of param names may be omitted"""
+    for candidate in (name, f"--{name}"):
+        if candidate in table:
+            return candidate
+    raise KeyError(f"Unknown column '{name}', available: {list(table)}")
+
+
+def select(table: dict[str, np.ndarray], mask: np.ndarray) -> dict[str, np.ndarray]:
+    return {name: column[mask] for name, column in table.items()}
+
+
+def where(table: dict[str, np.ndarray], conditions: list[str]) -> dict[str, np.ndarray]:
+    """
+    Keep the rows matching every condition.
+
+    Args:
+        table: Columns to filter
+        conditions: Conditions such as "--pht-pf-level=2" or "score>18.5"
+
+    Returns:
+        Filtered columns
+    """
+    mask = np.ones(len(table["id"]), dtype=bool)
+    for condition in conditions:
+        match = WHERE_RE.match(condition)
+        if match is None:
+            raise ValueError(f"Invalid condition '{condition}', expected <column><op><value>")
+        name, op, value = match.groups()
+        column = table[resolve(table, name)]
+        operand = float(value) if column.dtype.kind in "fi" else value
+        mask &= OPS[op](column, operand)
+    return select(table, mask)
+
+
+def top(table: dict[str, np.ndarray], k: int | None) -> list[dict]:
+    """Best [k] evaluations, all of them if None"""
+    order = np.argsort(-table["score"], kind="stable")[:k]
+    return [{name: column[i].item() for name, column in table.items()} for i in order]
+
+
+def marginals(table: dict[str, np.ndarray], params: list[str]) -> list[dict]:
+    """
+    Score statistics of every value of every param.
+
+    Returns:
+        Rows of param, value, count, mean, std and max of the score
+    """
+    score = table["score"]
+    rows = []
+    for name in params:
+        values, inverse = np.unique(table[name], return_inverse=True)
+        count = np.bincount(inverse)
+        total = np.bincount(inverse, weights=score)
+        squares = np.bincount(inverse, weights=score * score)
+        best = np.full(len(values), -np.inf)
+        np.maximum.at(best, inverse, score)
+
+        mean = total / count
+        std = np.sqrt(np.maximum(squares / count - mean * mean, 0))
+        for i, value in enumerate(values):
+            rows.append({
+                "param": name, "value": value.item(), "count": int(count[i]),
+                "mean": mean[i], "std": std[i], "max": best[i],
+            })
+    return rows
+
+
+def point_keys(table: dict[str, np.ndarray], params: list[str]) -> np.ndarray:
+    """One string per row identifying its param values"""
+    keys = np.full(len(table["id"]), "", dtype=object)
+    for name in params:
+        keys = keys + name + "=" + table[name].astype(str) + " "
+    return keys.astype(str)
+
+
+def best_per_point(table: dict[str, np.ndarray], params: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Unique points of a campaign and the best score reached by each of them"""
+    keys = point_keys(table, params)
+    order = np.argsort(-table["score"], kind="stable")
+    unique_keys, first = np.unique(keys[order], return_index=True)
+    return unique_keys, order[first]
+
+
+def diff(a: dict[str, np.ndarray], b: dict[str, np.ndarray]) -> list[dict]:
+    """
+    Compare the points evaluated by both campaigns.
+
+    Returns:
+        One row per shared point with its params, both scores and the delta b - a
+    """
+    params = [name for name in param_columns(a) if name in b]
+    keys_a, rows_a = best_per_point(a, params)
+    keys_b, rows_b = best_per_point(b, params)
+    _, ia, ib = np.intersect1d(keys_a, keys_b, return_indices=True)
+
+    score_a = a["score"][rows_a[ia]]
+    score_b = b["score"][rows_b[ib]]
+    delta = score_b - score_a
+
+    rows = []
+    for i in np.argsort(-np.abs(delta), kind="stable"):
+        row = {name: a[name][rows_a[ia[i]]].item() for name in params}
+        row.update({"score_a": score_a[i], "score_b": score_b[i], "delta": delta[i]})
+        rows.append(row)
+    return rows
+
+
+def summary(table: dict[str, np.ndarray]) -> list[dict]:
+    """Number of evaluations and best score of every campaign"""
+    campaigns, inverse = np.unique(table["campaign"], return_inverse=True)
+    best = np.full(len(campaigns), -np.inf)
+    np.maximum.at(best, inverse, table["score"])
+    count = np.bincount(inverse)
+    return [{"campaign": c.item(), "count": int(count[i]), "best": best[i]}
+            for i, c in enumerate(campaigns)]
+
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    if isinstance(value, np.floating):
+        return f"{float(value):.3f}"
+    return str(value)
+
+
+def write_rows(rows: list[dict], fmt: str, out):
+    """Write rows as an aligned table, CSV or JSON"""
+    if fmt == "json":
+        json.dump(rows, out, indent=2, default=lambda v: v.item())
+        out.write("\n")
+        return
+
+    columns = []
+    for row in rows:
+        columns += [name for name in row if name not in columns]
+
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+        return
+
+    cells = [[format_value(row.get(name, "")) for name in columns] for row in rows]
+    widths = [max([len(name)] + [len(c[i]) for c in cells]) + 2 for i, name in enumerate(columns)]
+    out.write("".join(f"{name:<{w}}" for name, w in zip(columns, widths)).rstrip() + "\n")
+    out.write("-" * sum(widths) + "\n")
+    for c in cells:
+        out.write("".join(f"{v:<{w}}" for v, w in zip(c, widths)).rstrip() + "\n")
+
+
+def campaign_label(path: str, labels: list[str]) -> str:
+    path = os.path.abspath(path)
+    label = os.path.basename(path if os.path.isdir(path) else os.path.dirname(path))
+    while label in labels:
+        label += "'"
+    return label
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Query and compare Bayesian optimization histories")
+    parser.add_argument("command", choices=["top", "marginals", "diff", "summary"],
+                        help="top: best evaluations, marginals: score per param value, "
+                             "diff: shared points of two campaigns, summary: best score per campaign")
+    parser.add_argument("paths", nargs="+",
+                        help="Campaign output directories, optimize_journal.jsonl or .pkl files")
+    parser.add_argument("-k", type=int, default=None, help="Number of evaluations listed by top")
+    parser.add_argument("--where", action="append", default=[],
+                        help="Filter such as 'l1d-pht-entries>=256' or 'rung=1', may be repeated. "
+                             "The leading '--' of params may be omitted, or pass --where=--name=value")
+    parser.add_argument("--param", action="append", default=[],
+                        help="Params reported by marginals, all by default")
+    parser.add_argument("--config", type=str, default=None,
+                        help="YAML configuration naming the params of histories without names")
+    parser.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    parser.add_argument("-o", "--output", type=str, default=None, help="Output file, stdout by default")
+    args = parser.parse_args()
+
+    param_names = None
+    if args.config is not None:
+        import config
+        param_names = [dim.name for dim in config.load_optimization_config(args.config).param_space]
+
+    labels = []
+    tables = []
+    for path in args.paths:
+        label = campaign_label(path, labels)
+        try:
+            table = load_campaign(path, label, param_names)
+        except FileNotFoundError as e:
+            # e.g. a glob over output/Optimize/* also matches directories of plain runs
+            print(f"Skip: {e}", file=sys.stderr)
+            continue
+        labels.append(label)
+        tables.append(where(table, args.where))
+    if not tables:
+        parser.error("no history found in the given paths")
+
+    if args.command == "diff":
+        if len(tables) != 2:
+            parser.error("diff takes exactly two campaigns")
+        rows = diff(tables[0], tables[1])
+    else:
+        table = concat(tables)
+        if args.command == "top":
+            rows = top(table, args.k)
+            if len(tables) == 1:
+                for row in rows:
+                    del row["campaign"]
+        elif args.command == "marginals":
+            rows = marginals(table, [resolve(table, p) for p in args.param] or param_columns(table))
+        else:
+            rows = summary(table)
+
+    if args.output is None:
+        write_rows(rows, args.format, sys.stdout)
+    else:
+        with open(args.output, "w", newline="") as f:
+            write_rows(rows, args.format, f)
+        print(f"Saving {len(rows)} rows to {args.output}")
@@ -1,13 +1,21 @@
-from skopt import gp_minimize
-from skopt.utils import use_named_args
+from skopt import gp_minimize, Optimizer
+from skopt.utils import use_named_args, cook_estimator, normalize_dimensions
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pickle
 import os
 import re
 import copy
+import time
+import dataclasses
 
 # import cust
 import runGem5
 import config
+import scorer
+import watcher
+import evalcache
+import journal
 
 
 def power_of_two_range(min_power, max_power):
@@ -21,43 +29,84 @@ WORKLOAD_LIST: list[config.WorkloadConfig]
 ARCH_LIST: list[config.ArchParamConfig]
 SERVER_LIST: list[str]
 OPT_CONFIG: config.OptimizationConfig
+# checkpoints issued at each fidelity rung, the last rung is the full WORKLOAD_LIST
+RUNG_WORKLOADS: list[list[config.WorkloadConfig]]
+# scores observed at each rung except the last one, keyed by evaluation cache key
+RUNG_SCORES: list[dict[str, float]]
+EVAL_CACHE: evalcache.EvalCache
+JOURNAL: journal.Journal
 
-# define the object value
 
+def make_arch(params: dict) -> config.ArchParamConfig:
+    """
+    Build the arch configuration evaluated for a set of tuned params.
 
-def objective_function(**params):
-    print(f"\nTry Params:")
-    for key, value in params.items():
-        print(f"  {key} = {value}")
+    Args:
+        params: Mapping from script parameter name to value
+
+    Returns:
+        ArchParamConfig named after the param values
+    """
     # convert params to script params
     script_params = copy.deepcopy(OPT_CONFIG.constant_params)
     for key, value in params.items():
         script_params += [f"{key}={value}"]
     stamp = f"{'_'.join([str(v) for v in params.values()])}"
 
-    run = RUN_CONFIGS
+    arch = copy.deepcopy(ARCH_LIST[0])
+    arch.arch_name = f"config_{stamp}"
+    arch.script_params = script_params
+    return arch
 
-    arch_list = [copy.deepcopy(ARCH_LIST[0])]
-    arch_list[0].arch_name = f"config_{stamp}"
-    arch_list[0].script_params = script_params
 
+def new_accumulator(arch_name: str) -> scorer.StreamingScore | None:
+    """Streaming score of a configuration, None when scoring with gem5_data_proc"""
+    if RUN_CONFIGS.scorer != "native":
+        return None
+    return scorer.StreamingScore(
+        os.path.join(RUN_CONFIGS.output_base_dir, arch_name), ENV_CONFIGS)
 
-    # issue config to run
-    issued_configs = runGem5.issue_archs(
-        env=ENV_CONFIGS,
-        run=run,
-        workload_list=WORKLOAD_LIST,
-        arch_list=arch_list,
-        server_list=SERVER_LIST,
-    )
 
-    # monitor finish
-    finished_configs = runGem5.monitor_run_progress(
-        issued_configs, RUN_CONFIGS.output_base_dir, 10)
+def read_score(arch_name: str, accumulator: scorer.StreamingScore | None = None
+               ) -> tuple[float, scorer.ScoreResult | None]:
+    """
+    Compute the score of a finished configuration.
+
+    Args:
+        arch_name: Name of the finished configuration
+        accumulator: Streaming score fed while monitoring the configuration
+
+    Returns:
+        Estimated Int score per GHz, 0 if no score is available, and the
+        per-workload result when scoring natively
+
+    Raises:
+        ValueError: If the instruction counts of the workloads can not be read,
+                    every score would be wrong, see scorer.load_insts
+    """
+    failure = runGem5.config_failure(arch_name)
+    if failure is not None:
+        # a rejected configuration, the checkpoints which completed before do not give a fair score
+        print(f"failed: {failure}")
+        return 0, None
+
+    if RUN_CONFIGS.scorer == "native":
+        config_path = os.path.join(RUN_CONFIGS.output_base_dir, arch_name)
+        if accumulator is not None:
+            result = accumulator.finalize()
+        else:
+            result = scorer.score_config(config_path, ENV_CONFIGS)
+        scorer.write_score(result, f"{config_path}.score.txt")
+        score = result.int_score
+        if score is not None:
+            print(f"score: {score}")
+        else:
+            print("no score something error")
+            score = 0
+        return score, result
 
-    # compute final score
     score_files = runGem5.calculate_performance_scores(
-        finished_configs, RUN_CONFIGS.output_base_dir, ENV_CONFIGS)
+        [arch_name], RUN_CONFIGS.output_base_dir, ENV_CONFIGS, RUN_CONFIGS.scorer)
 
     score_file = os.path.join(RUN_CONFIGS.output_base_dir, score_files[0])
 
@@ -70,7 +119,295 @@ def objective_function(**params):
         else:
             print("no score something error")
             score = 0
-    return -score
+    return score, None
+
+
+def issue_rung(arch: config.ArchParamConfig, rung: int) -> list[str]:
+    """
+    Issue the checkpoints of fidelity [rung] for a configuration.
+
+    Each rung is a prefix of the next one, so higher rungs are issued with
+    resume and only the checkpoints not run by the lower rungs start.
+
+    Returns:
+        Issued configurations, see runGem5.issue_archs
+    """
+    run = RUN_CONFIGS if rung == 0 else dataclasses.replace(RUN_CONFIGS, resume=True)
+    return runGem5.issue_archs(
+        env=ENV_CONFIGS,
+        run=run,
+        workload_list=RUNG_WORKLOADS[rung],
+        arch_list=[arch],
+        server_list=SERVER_LIST,
+    )
+
+
+def promote(arch: config.ArchParamConfig, rung: int, score: float) -> bool:
+    """
+    Successive halving: record the score reached at [rung] and decide
+    whether the configuration continues to the next rung.
+
+    A configuration is promoted when it ranks in the top 1/eta of every
+    score seen at this rung so far, the first ones are always promoted.
+    Scores are recorded once per evaluation cache key, so a cached or
+    re-proposed configuration does not count twice.
+
+    Returns:
+        True if the configuration should run the checkpoints of the next rung
+    """
+    if rung == len(RUNG_WORKLOADS) - 1:
+        return False
+
+    RUNG_SCORES[rung][rung_key(arch, rung)] = score
+    scores = list(RUNG_SCORES[rung].values())
+    keep = max(1, len(scores) // OPT_CONFIG.fidelity_eta)
+    promoted = sorted(scores, reverse=True).index(score) < keep
+    print(f"Rung {rung + 1}/{len(RUNG_WORKLOADS)} of {arch.arch_name}: "
+          f"{'promoted' if promoted else 'stopped'} (top {keep} of {len(scores)})")
+    return promoted
+
+
+def rung_key(arch: config.ArchParamConfig, rung: int) -> str:
+    """Evaluation cache key of a configuration run on the checkpoints of [rung]"""
+    return evalcache.eval_key(RUN_CONFIGS.gem5_bin, arch, RUNG_WORKLOADS[rung])
+
+
+def store_score(arch: config.ArchParamConfig, rung: int, entry: dict):
+    """Cache the entry of a finished rung, failed evaluations are not cached"""
+    if entry["score"] > 0:
+        EVAL_CACHE.put(rung_key(arch, rung), entry)
+
+
+def advance(arch: config.ArchParamConfig, rung: int) -> tuple[int, dict | None]:
+    """
+    Replay the cached rungs of a configuration from [rung] on.
+
+    Returns:
+        The first rung without a cached score and None, or the rung the
+        configuration stopped at and its cached entry
+    """
+    while True:
+        entry = EVAL_CACHE.get(rung_key(arch, rung))
+        if entry is None:
+            return rung, None
+        print(f"Cached score of {arch.arch_name}: {entry['score']}")
+        if not promote(arch, rung, entry["score"]):
+            return rung, entry
+        rung += 1
+
+
+def record(x: list, entry: dict, rung: int, start: float, cached: bool):
+    """Append a finished evaluation to the journal"""
+    JOURNAL.append({
+        "x": list(x),
+        "params": dict(zip([dim.name for dim in OPT_CONFIG.param_space], x)),
+        "y": -entry["score"],
+        "rung": rung,
+        "cached": cached,
+        "start": start,
+        "end": time.time(),
+        **entry,
+    })
+
+
+def print_params(params: dict):
+    print(f"\nTry Params:")
+    for key, value in params.items():
+        print(f"  {key} = {value}")
+
+
+# define the object value
+
+
+def objective_function(**params):
+    print_params(params)
+    x = [params[dim.name] for dim in OPT_CONFIG.param_space]
+    arch_list = [make_arch(params)]
+    accumulator = new_accumulator(arch_list[0].arch_name)
+    start = time.time()
+
+    rung, entry = advance(arch_list[0], 0)
+    cached = entry is not None
+    while entry is None:
+        # issue config to run
+        issued_configs = issue_rung(arch_list[0], rung)
+
+        # monitor finish
+        finished_configs = runGem5.monitor_run_progress(
+            issued_configs, RUN_CONFIGS.output_base_dir, 10, watch=RUN_CONFIGS.watch,
+            accumulators={arch_list[0].arch_name: accumulator} if accumulator is not None else None)
+
+        if not finished_configs:
+            print("no score something error")
+            entry = evalcache.make_entry(arch_list[0].arch_name, 0)
+            break
+
+        # compute the score reached at this rung
+        score, result = read_score(finished_configs[0], accumulator)
+        entry = evalcache.make_entry(finished_configs[0], score, result)
+        store_score(arch_list[0], rung, entry)
+        if not promote(arch_list[0], rung, score):
+            break
+        rung, entry = advance(arch_list[0], rung + 1)
+
+    record(x, entry, rung, start, cached)
+    return -entry["score"]
+
+
+def ask_with_pending(optimizer: Optimizer, pending: list, strategy: str) -> list:
+    """
+    Ask for a new point while other points are still being evaluated.
+
+    The pending points are told to a copy of the optimizer with a constant
+    lie (the min, mean or max of the observed values), so the next point
+    is pushed away from the configurations already in flight.
+
+    Args:
+        optimizer: Optimizer holding the finished evaluations
+        pending: Points issued but not yet told
+        strategy: One of config.BATCH_STRATEGIES
+
+    Returns:
+        The next point to evaluate
+    """
+    if not pending:
+        return optimizer.ask()
+
+    if strategy == "cl_min":
+        y_lie = np.min(optimizer.yi) if optimizer.yi else 0.0
+    elif strategy == "cl_mean":
+        y_lie = np.mean(optimizer.yi) if optimizer.yi else 0.0
+    else:
+        y_lie = np.max(optimizer.yi) if optimizer.yi else 0.0
+
+    opt = optimizer.copy(
+        random_state=optimizer.rng.randint(0, np.iinfo(np.int32).max))
+    opt.tell(pending, [y_lie] * len(pending))
+    return opt.ask()
+
+
+def batch_minimize(optimizer: Optimizer, n_calls: int, batch_size: int, strategy: str,
+                   callback=None, check_interval: int = 10):
+    """
+    Asynchronous batch Bayesian optimization with the ask/tell interface.
+
+    Keeps up to [batch_size] configurations running on the servers and
+    tells each result back as soon as its configuration finishes, then
+    asks for a replacement so the cluster never waits on a whole batch.
+    With fidelity rungs, a configuration promoted by successive halving
+    stays in flight while the checkpoints of its next rung run.
+
+    Args:
+        optimizer: Optimizer to drive, may already hold resumed evaluations
+        n_calls: Number of new evaluations
+        batch_size: Number of configurations kept in flight
+        strategy: Constant liar strategy for pending points
+        callback: Called with the OptimizeResult after every tell
+        check_interval: Time between progress checks in seconds
+
+    Returns:
+        OptimizeResult of the optimizer
+    """
+    dim_names = [dim.name for dim in OPT_CONFIG.param_space]
+
+    # arch_name -> {"points": [...], "arch": arch, "rung": fidelity rung, "future": issuing future,
+    #              "watched": bool, "accumulator": streaming score, "start": issue time}
+    in_flight = {}
+    asked = 0
+    told = 0
+    completion_watcher = watcher.CompletionWatcher() if RUN_CONFIGS.watch else None
+
+    def tell(points: list, entry: dict, rung: int, start: float, cached: bool = False):
+        nonlocal told
+        for x in points:
+            record(x, entry, rung, start, cached)
+            result = optimizer.tell(x, -entry["score"])
+            told += 1
+            if callback is not None:
+                callback(result)
+
+    with ThreadPoolExecutor(max_workers=batch_size) as pool:
+        while told < n_calls:
+            # keep [batch_size] distinct configurations in flight
+            while len(in_flight) < batch_size and asked < n_calls:
+                pending = [x for flight in in_flight.values()
+                           for x in flight["points"]]
+                x = ask_with_pending(optimizer, pending, strategy)
+                asked += 1
+
+                params = dict(zip(dim_names, x))
+                print_params(params)
+                arch = make_arch(params)
+
+                # the optimizer proposed a configuration which is already running
+                if arch.arch_name in in_flight:
+                    in_flight[arch.arch_name]["points"].append(x)
+                    continue
+
+                rung, entry = advance(arch, 0)
+                if entry is not None:
+                    tell([x], entry, rung, time.time(), cached=True)
+                    continue
+
+                in_flight[arch.arch_name] = {
+                    "points": [x],
+                    "arch": arch,
+                    "rung": rung,
+                    "future": pool.submit(issue_rung, arch, rung),
+                    "watched": False,
+                    "accumulator": new_accumulator(arch.arch_name),
+                    "start": time.time(),
+                }
+
+            # watch configurations once all their output directories exist
+            if completion_watcher is not None:
+                for arch_name, flight in in_flight.items():
+                    if not flight["watched"] and flight["future"].done():
+                        completion_watcher.add(
+                            os.path.join(RUN_CONFIGS.output_base_dir, arch_name))
+                        flight["watched"] = True
+
+            finished = [
+                arch_name for arch_name, flight in in_flight.items()
+                if flight["future"].done() and (
+                    not flight["future"].result() or
+                    runGem5.is_config_finished(arch_name, RUN_CONFIGS.output_base_dir,
+                                               flight["accumulator"]))
+            ]
+
+            for arch_name in finished:
+                flight = in_flight[arch_name]
+                if completion_watcher is not None:
+                    completion_watcher.remove(
+                        os.path.join(RUN_CONFIGS.output_base_dir, arch_name))
+                if flight["future"].result():
+                    print(f"\nFinish: {arch_name}")
+                    score, result = read_score(arch_name, flight["accumulator"])
+                    entry = evalcache.make_entry(arch_name, score, result)
+                    store_score(flight["arch"], flight["rung"], entry)
+                    if promote(flight["arch"], flight["rung"], score):
+                        rung, entry = advance(flight["arch"], flight["rung"] + 1)
+                        if entry is None:
+                            flight["rung"] = rung
+                            flight["future"] = pool.submit(issue_rung, flight["arch"], rung)
+                            flight["watched"] = False
+                            continue
+                        flight["rung"] = rung
+                else:
+                    print(f"\nFailed to issue: {arch_name}")
+                    entry = evalcache.make_entry(arch_name, 0)
+                del in_flight[arch_name]
+                tell(flight["points"], entry, flight["rung"], flight["start"])
+
+            if not finished:
+                if completion_watcher is not None:
+                    completion_watcher.wait(check_interval)
+                else:
+                    time.sleep(check_interval)
+
+    if completion_watcher is not None:
+        completion_watcher.close()
+    return optimizer.get_result()
 
 
 if __name__ == "__main__":
@@ -96,53 +433,89 @@ if __name__ == "__main__":
     ENV_CONFIGS, RUN_CONFIGS, WORKLOAD_LIST, ARCH_LIST, SERVER_LIST = config.load_yaml(
         config_file)
     OPT_CONFIG = config.load_optimization_config(config_file)
+    RUNG_WORKLOADS = [config.select_cpts(WORKLOAD_LIST, weight)
+                      for weight in OPT_CONFIG.fidelity_rungs] + [WORKLOAD_LIST]
+    RUNG_SCORES = [{} for _ in OPT_CONFIG.fidelity_rungs]
+    EVAL_CACHE = evalcache.EvalCache(
+        OPT_CONFIG.eval_cache or os.path.join(RUN_CONFIGS.output_base_dir, "eval_cache"))
 
     output_dir = RUN_CONFIGS.output_base_dir
     result_file = f"{output_dir}/optimize_result.pkl"
     checkpoint_file = f"{output_dir}/optimize_checkpoint.pkl"
+    journal_file = f"{output_dir}/optimize_journal.jsonl"
     plot_convergence_file = f"{output_dir}/optimization_convergence.png"
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    if os.path.exists(checkpoint_file):
+    if RUN_CONFIGS.scorer == "native":
+        # fail before issuing anything rather than scoring every configuration 0
+        scorer.load_insts(os.path.join(ENV_CONFIGS.workload_root, "cluster-0-0.json"))
+
+    JOURNAL = journal.Journal(journal_file)
+    start_params, start_score = JOURNAL.history()
+    if start_params:
+        print(f"Loading Bayesian Journal: {len(start_params)} evaluations")
+    elif os.path.exists(checkpoint_file):
+        # campaigns started before the journal existed
         print("Loading Bayesian Checkpoints...")
         with open(checkpoint_file, 'rb') as f:
             checkpoint = pickle.load(f)
             start_params = checkpoint['params']
             start_score = checkpoint['score']
-    else:
+        # named like the records of new evaluations, so analyze.py shows one column per param
+        param_names = [dim.name for dim in OPT_CONFIG.param_space]
+        for x, y in zip(start_params, start_score):
+            JOURNAL.append({"x": list(x), "params": dict(zip(param_names, x)), "y": y})
+    if not start_params:
         start_params = None
         start_score = None
 
-    def checkpoint_callback(res):
-        with open(checkpoint_file, 'wb') as f:
-            pickle.dump({
-                'params': res.x_iters,
-                'score': res.func_vals
-            }, f)
-            print(f"Saving Checkpoint to {checkpoint_file}")
-
-    result = gp_minimize(
-        func=use_named_args(dimensions=OPT_CONFIG.param_space)(
-            objective_function),
-        dimensions=OPT_CONFIG.param_space,
-        n_calls=n_calls,
-        n_initial_points=n_initial_points if start_params is None else 0,
-        n_jobs=n_parallel,
-        acq_func="LCB",
-        x0=start_params,
-        y0=start_score,
-        random_state=42,
-        verbose=True,
-        callback=[checkpoint_callback],
-    )
+    # shared by every issuing thread, created before they start
+    runGem5.start_services(RUN_CONFIGS, SERVER_LIST)
+
+    if OPT_CONFIG.batch_size > 1:
+        # same surrogate as gp_minimize, driven through ask/tell
+        space = normalize_dimensions(OPT_CONFIG.param_space)
+        optimizer = Optimizer(
+            dimensions=space,
+            base_estimator=cook_estimator(
+                "GP", space=space, random_state=42, noise="gaussian"),
+            n_initial_points=n_initial_points if start_params is None else 0,
+            acq_func="LCB",
+            random_state=42,
+            n_jobs=n_parallel,
+        )
+        if start_params is not None:
+            optimizer.tell([list(x) for x in start_params], list(start_score))
+
+        result = batch_minimize(
+            optimizer,
+            n_calls=n_calls,
+            batch_size=OPT_CONFIG.batch_size,
+            strategy=OPT_CONFIG.batch_strategy,
+        )
+    else:
+        result = gp_minimize(
+            func=use_named_args(dimensions=OPT_CONFIG.param_space)(
+                objective_function),
+            dimensions=OPT_CONFIG.param_space,
+            n_calls=n_calls,
+            n_initial_points=n_initial_points if start_params is None else 0,
+            n_jobs=n_parallel,
+            acq_func="LCB",
+            x0=start_params,
+            y0=start_score,
+            random_state=42,
+            verbose=True,
+        )
 
-    with open(result_file, 'wb') as f:
-        pickle.dump(result, f)
-        print(f"Saving Result to {result_file}")
+    if OPT_CONFIG.save_result:
+        with open(result_file, 'wb') as f:
+            pickle.dump(result, f)
+            print(f"Saving Result to {result_file}")
 
-    print(f"optimize finish: {result_file}")
+    print(f"optimize finish: {journal_file}")
     print("best Param")
     for i, param_name in enumerate([dim.name for dim in OPT_CONFIG.param_space]):
         print(f"{param_name}: {result.x[i]}")
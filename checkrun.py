@@ -3,70 +3,302 @@
 import os
 import sys
 import re
+import time
 from tqdm import tqdm
 import argparse
 
+# Leaf directory states
+COMPLETE = "complete"
+ERROR = "error"
+MISSING = "missing"     # simout or simerr not created (yet), counted as error
+RUNNING = "running"     # Unknown Error or Running
+
+# States which never change again
+TERMINAL_STATES = (COMPLETE, ERROR)
+
+# Written to simerr when a stalled run is given up, see watchdog.py
+HUNG_MARKER = "Simulation stalled and was killed"
+
+# Written to simerr of the running checkpoints of a configuration which failed deterministically, see retry.py
+CANCELLED_MARKER = "Simulation cancelled after a deterministic failure"
+
+# Error classes, see error_class
+TRANSIENT = "transient"           # no output at all, e.g. the launch or the node was lost
+DETERMINISTIC = "deterministic"   # the configuration is rejected, every checkpoint fails the same way
+CRASH = "crash"                   # the simulation failed, a rerun fails the same way
+KILLED = "killed"                 # given up or cancelled by these scripts
+
+COMPLETE_PATTERNS = [
+    "because a thread reached the max instruction count",
+    "because m5_exit instruction encountered when simulating XS"
+]
+
+CRASH_PATTERNS = [
+    "Program aborted at tick",
+    "Failed to execute default signal handler!",
+    "gem5 has encountered a segmentation fault!",
+]
+
+DETERMINISTIC_PATTERNS = [
+    "error: ambiguous option:",
+    "AttributeError:",
+]
+
+KILLED_PATTERNS = [
+    HUNG_MARKER,
+    CANCELLED_MARKER,
+]
+
+ERROR_PATTERNS = CRASH_PATTERNS + DETERMINISTIC_PATTERNS + KILLED_PATTERNS
+
+# One alternation per error class, the group name tells which class matched
+ERROR_CLASS_RE = re.compile(
+    f"(?P<{DETERMINISTIC}>" + "|".join(DETERMINISTIC_PATTERNS) + ")|"
+    f"(?P<{KILLED}>" + "|".join(KILLED_PATTERNS) + ")|"
+    f"(?P<{CRASH}>" + "|".join(CRASH_PATTERNS) + ")"
+)
+
+# One alternation matching every marker, the group name tells which kind matched
+MARKER_RE = re.compile(
+    "(?P<complete>" + "|".join(COMPLETE_PATTERNS) + ")|"
+    "(?P<error>" + "|".join(ERROR_PATTERNS) + ")"
+)
+
+# Markers are printed at the end of a run, only this many trailing bytes are scanned
+TAIL_BYTES = 64 * 1024
+
+# Directory listings modified more recently than this (seconds) are not cached,
+# a file created in the same mtime tick would otherwise be missed
+LISTING_SETTLE = 2
+
+
+def cpt_dir_of(leaf: str) -> str:
+    """Checkpoint output directory of a leaf (the m5out inside it, or itself)"""
+    return os.path.dirname(leaf) if os.path.basename(leaf) == "m5out" else leaf
+
+
+def classify(simout: str, simerr: str) -> str:
+    """
+    Classify a run from the content (or the tails) of its simout and simerr.
+
+    Returns:
+        COMPLETE, ERROR or RUNNING
+    """
+    if "complete" in {m.lastgroup for m in MARKER_RE.finditer(simout)}:
+        return COMPLETE
+    elif "error" in {m.lastgroup for m in MARKER_RE.finditer(simerr)}:
+        return ERROR
+    return RUNNING
+
+
+def read_tail(path: str, size: int, tail_bytes: int | None) -> str:
+    """Read the last [tail_bytes] bytes of a file of [size] bytes, the whole file if None"""
+    with open(path, "rb") as f:
+        if tail_bytes is not None and size > tail_bytes:
+            f.seek(size - tail_bytes)
+        return f.read().decode(errors="replace")
+
+
+def error_class(leaf: str) -> tuple[str, str]:
+    """
+    Classify the failure of an errored or missing leaf from its simerr.
+
+    A deterministic error wins over the others, as a rejected option fails
+    before anything else can happen.
+
+    Returns:
+        (error class, the line holding the error), TRANSIENT with an empty line if simerr holds no error
+    """
+    path = os.path.join(leaf, "simerr")
+    try:
+        simerr = read_tail(path, os.path.getsize(path), TAIL_BYTES)
+    except OSError:
+        return TRANSIENT, ""
+    matches = {m.lastgroup: m for m in ERROR_CLASS_RE.finditer(simerr)}
+    for kind in (DETERMINISTIC, KILLED, CRASH):
+        if kind in matches:
+            m = matches[kind]
+            end = simerr.find("\n", m.end())
+            return kind, simerr[simerr.rfind("\n", 0, m.start()) + 1:end if end >= 0 else None].strip()
+    return TRANSIENT, ""
+
+
+class RunChecker:
+    """
+    Stateful check_run for repeated polls of the same directory
+
+    Subtrees whose leaves all reached a terminal state (complete or error)
+    are never visited again, directory listings are reused while the
+    directory mtime is unchanged, and simout/simerr are only re-read when
+    their size or mtime changed. The cost of a poll therefore tracks the
+    checkpoints which are still running.
+
+    Only the last [tail_bytes] of simout/simerr are scanned. When the tails
+    hold no marker the whole files are scanned, but only on the first
+    sighting or once the files stopped changing, so a running job is never
+    read in full on every poll.
+    """
+
+    def __init__(self, path: str, tail_bytes: int | None = TAIL_BYTES):
+        self.path = path
+        self.tail_bytes = tail_bytes
+        # leaf -> state of the last check
+        self.states: dict[str, str] = {}
+        # leaves which became complete during the last check
+        self.newly_complete: list[str] = []
+        # directory -> (mtime_ns, dirs, files)
+        self._listing: dict[str, tuple[int, list[str], list[str]]] = {}
+        # leaf -> (signature of simout/simerr, state, whether the whole files were scanned)
+        self._leaves: dict[str, tuple[tuple, str, bool]] = {}
+        # directory whose leaves are all terminal -> [(leaf, state)]
+        self._done: dict[str, list[tuple[str, str]]] = {}
+
+    def forget(self, path: str):
+        """Drop every cached state under [path], e.g. before re-running a checkpoint"""
+        prefix = path.rstrip(os.sep) + os.sep
+        for cache in (self._listing, self._leaves, self._done):
+            for key in [k for k in cache if k == path or k.startswith(prefix)]:
+                del cache[key]
+        # parents of [path] may hold it in their finished subtree
+        for key in [k for k in self._done if path.startswith(k.rstrip(os.sep) + os.sep)]:
+            del self._done[key]
+
+    def _list(self, path: str) -> tuple[list[str], list[str]]:
+        st = os.stat(path)
+        cached = self._listing.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns:
+            return cached[1], cached[2]
+
+        dirs, files = [], []
+        with os.scandir(path) as it:
+            for entry in it:
+                (dirs if entry.is_dir() else files).append(entry.name)
+
+        if time.time() - st.st_mtime > LISTING_SETTLE:
+            self._listing[path] = (st.st_mtime_ns, dirs, files)
+        return dirs, files
+
+    def _check_leaf(self, leaf: str, files: list[str]) -> str:
+        if "simout" not in files or "simerr" not in files:
+            return MISSING
+
+        simout_path = os.path.join(leaf, "simout")
+        simerr_path = os.path.join(leaf, "simerr")
+        simout_stat = os.stat(simout_path)
+        simerr_stat = os.stat(simerr_path)
+        signature = (simout_stat.st_size, simout_stat.st_mtime_ns,
+                     simerr_stat.st_size, simerr_stat.st_mtime_ns)
+
+        cached = self._leaves.get(leaf)
+        if cached is not None and cached[0] == signature:
+            _, state, full = cached
+            if state != RUNNING or full:
+                return state
+            # the files stopped changing but only their tails were scanned
+            state = self._classify_files(simout_path, simerr_path, signature, None)
+            self._leaves[leaf] = (signature, state, True)
+            return state
+
+        state = self._classify_files(simout_path, simerr_path, signature, self.tail_bytes)
+        full = self._fits_tail(signature)
+        if state == RUNNING and not full and cached is None:
+            # ambiguous tail on first sighting
+            state = self._classify_files(simout_path, simerr_path, signature, None)
+            full = True
+        self._leaves[leaf] = (signature, state, full)
+        return state
+
+    def _fits_tail(self, signature: tuple) -> bool:
+        return self.tail_bytes is None or (
+            signature[0] <= self.tail_bytes and signature[2] <= self.tail_bytes)
+
+    def _classify_files(self, simout_path: str, simerr_path: str,
+                        signature: tuple, tail_bytes: int | None) -> str:
+        simout = read_tail(simout_path, signature[0], tail_bytes)
+        simerr = read_tail(simerr_path, signature[2], tail_bytes)
+        return classify(simout, simerr)
+
+    def _scan(self, path: str, is_root: bool = False) -> list[tuple[str, str]]:
+        if path in self._done:
+            return self._done[path]
+
+        try:
+            dirs, files = self._list(path)
+        except FileNotFoundError:
+            return []
+
+        if len(dirs) == 0:
+            results = [(path, self._check_leaf(path, files))]
+        else:
+            results = []
+            for d in sorted(dirs):
+                results += self._scan(os.path.join(path, d))
+
+        # the root may still receive new checkpoints
+        if not is_root and results and all(state in TERMINAL_STATES for _, state in results):
+            self._done[path] = results
+        return results
+
+    def check(self) -> tuple[int, int, int, list[str]]:
+        """
+        Check the running status of all checkpoints, see check_run.
+        """
+        results = self._scan(self.path, is_root=True)
+        self.newly_complete = [
+            leaf for leaf, state in results
+            if state == COMPLETE and self.states.get(leaf) != COMPLETE
+        ]
+        self.states = dict(results)
+
+        complete = sum(1 for _, state in results if state == COMPLETE)
+        error_list = [leaf for leaf, state in results if state in (ERROR, MISSING)]
+        return complete, len(error_list), len(results), error_list
+
+
+_CHECKERS: dict[str, RunChecker] = {}
+
+
+def get_checker(path: str) -> RunChecker:
+    """Return the RunChecker of [path], created on first use and kept for later polls"""
+    path = os.path.abspath(path)
+    if path not in _CHECKERS:
+        _CHECKERS[path] = RunChecker(path)
+    return _CHECKERS[path]
+
+
 def check_run(path) -> tuple[int, int, int, int]:
     """
     Check the running status of all checkpoints in the specified directory
 
     Args:
         path (str): The path to the directory to check.
-    
+
     Returns:
         tuple: A tuple containing the number of completed runs, the number of errors, the total number of runs, and a list of error paths.
     """
-
-    complete  = 0
-    error = 0
-    total = 0
-    error_list = []
-    for root, dirs, files in os.walk(path):
-        if len(dirs) == 0:
-            total += 1
-            if "simout" in files and "simerr" in files:
-                simout_path = os.path.join(root, "simout")
-                simerr_path = os.path.join(root, "simerr")
-                with open(simout_path, "r") as simout_file, open(simerr_path, "r") as simerr_file:
-                    simout = simout_file.read()
-                    simerr = simerr_file.read()
-
-                if any(re.search(pattern, simout) for pattern in [
-                                "because a thread reached the max instruction count",
-                                "because m5_exit instruction encountered when simulating XS"
-                            ]):
-                    complete += 1
-                    if __name__ == "__main__":
-                        print(f"Success done in {root}")
-                    pass
-                elif any(re.search(pattern, simerr) for pattern in [
-                            "Program aborted at tick",
-                            "Failed to execute default signal handler!",
-                            "gem5 has encountered a segmentation fault!",
-                            "error: ambiguous option:",
-                            "AttributeError:"
-                        ]):
-                    error_list.append(root)
-                    error += 1
-                else:
-                    if __name__ == "__main__":
-                        print(f"Unknown Error or Running in {root}")
-                    pass
-            else:
-                error_list.append(root)
-                error += 1
-    return complete, error, total, error_list
+    return RunChecker(path).check()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("dir", help="DIR for check running status.")
+    parser.add_argument("--full",
+                        action="store_true",
+                        default=False,
+                        help="scan whole simout/simerr instead of their tails")
 
     args = parser.parse_args()
-    complete, error, total, error_list = check_run(args.dir)
+    checker = RunChecker(args.dir, tail_bytes=None if args.full else TAIL_BYTES)
+    complete, error, total, error_list = checker.check()
+
+    for leaf, state in checker.states.items():
+        if state == COMPLETE:
+            print(f"Success done in {leaf}")
+        elif state == RUNNING:
+            print(f"Unknown Error or Running in {leaf}")
 
     for e in error_list:
         print(f"Error Path: {e}")
 
     print(f"Complete: {complete}/{total}")
     print(f"Error: {error}/{total}")
-    print(f"Success rate: {complete/total*100:.2f}%")
\ No newline at end of file
+    print(f"Success rate: {complete/total*100:.2f}%")
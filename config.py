@@ -1,10 +1,14 @@
 import yaml
 import os
 import re
-import pathlib
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from skopt.space import Dimension, Categorical, Integer, Real
 
+# Load custom modules
+import admission
+import cptcost
+import cptindex
+
 
 @dataclass
 class ArchParamConfig:
@@ -39,6 +43,17 @@ class EnvironmentConfig:
     workload_version: str
 
 
+@dataclass
+class ServerConfig:
+    """
+    Class to hold the admission overrides of one server, None keeps the running defaults
+    """
+    name: str
+    max_proc: int | None = None
+    cores: int | None = None
+    mem_reserve_gb: float | None = None
+
+
 @dataclass
 class RunningConfig:
     """
@@ -48,6 +63,26 @@ class RunningConfig:
     max_proc_per_server: int
     output_base_dir: str
     resume: bool
+    watch: bool = False
+    scorer: str = "native"
+    score_workers: int | None = None
+    stage_dir: str | None = None
+    stage_limit_gb: float = 100
+    schedule: str = "lpt"
+    speculate: float | None = None
+    stall_timeout: float | None = None
+    max_retries: int = 2
+    ledger: str | None = None
+    job_mem_gb: float | None = None
+    mem_reserve_gb: float = 4
+    servers: dict[str, ServerConfig] = field(default_factory=dict)
+    runtime_prior: dict[str, float] = field(default_factory=dict)
+    runtime_history: list[str] = field(default_factory=list)
+
+
+SCORERS = ("native", "gem5_data_proc")
+
+SCHEDULES = ("fifo", "lpt")
 
 
 @dataclass
@@ -57,6 +92,15 @@ class OptimizationConfig:
     """
     constant_params: list[str]
     param_space: list[Dimension]
+    batch_size: int = 1
+    batch_strategy: str = "cl_min"
+    fidelity_rungs: list[float] = field(default_factory=list)
+    fidelity_eta: int = 3
+    eval_cache: str | None = None
+    save_result: bool = False
+
+
+BATCH_STRATEGIES = ("cl_min", "cl_mean", "cl_max")
 
 
 def pow2range(min_power, max_power):
@@ -193,14 +237,84 @@ def load_optimization_config(config_file: str) -> OptimizationConfig:
 
     opt_config = config["optimization"]
     constant_params = opt_config["constant_params"] if "constant_params" in opt_config else []
+
+    batch_size = opt_config.get("batch_size", 1)
+    if not isinstance(batch_size, int) or batch_size < 1:
+        raise ValueError(f"'batch_size' must be a positive integer, got {batch_size}")
+
+    batch_strategy = opt_config.get("batch_strategy", "cl_min")
+    if batch_strategy not in BATCH_STRATEGIES:
+        raise ValueError(f"Unsupported batch strategy: {batch_strategy}, expected one of {BATCH_STRATEGIES}")
+
+    fidelity = opt_config.get("fidelity") or {}
+    fidelity_rungs = fidelity.get("rungs", [])
+    fidelity_eta = fidelity.get("eta", 3)
+    run_weight = config["workloads"]["run_weight"]
+
+    if not isinstance(fidelity_rungs, list) or not all(isinstance(w, (int, float)) for w in fidelity_rungs):
+        raise TypeError(f"'fidelity.rungs' must be a list of numbers, got {fidelity_rungs}")
+    if any(a >= b for a, b in zip(fidelity_rungs, fidelity_rungs[1:])):
+        raise ValueError(f"'fidelity.rungs' must be strictly increasing, got {fidelity_rungs}")
+    if fidelity_rungs and (fidelity_rungs[0] <= 0 or fidelity_rungs[-1] >= run_weight):
+        raise ValueError(f"'fidelity.rungs' must be in (0, run_weight={run_weight}), got {fidelity_rungs}")
+    if not isinstance(fidelity_eta, int) or fidelity_eta < 2:
+        raise ValueError(f"'fidelity.eta' must be an integer >= 2, got {fidelity_eta}")
+
+    eval_cache = opt_config.get("eval_cache")
+    if eval_cache is not None and not isinstance(eval_cache, str):
+        raise TypeError(f"'eval_cache' must be a path, got {eval_cache}")
+
+    save_result = opt_config.get("save_result", False)
+    if not isinstance(save_result, bool):
+        raise TypeError(f"'save_result' must be a boolean, got {save_result}")
+
     return OptimizationConfig(
         constant_params=constant_params,
         param_space=[
             parse_param_space(param)
             for param in opt_config["param_space"]
-        ]
+        ],
+        batch_size=batch_size,
+        batch_strategy=batch_strategy,
+        fidelity_rungs=fidelity_rungs,
+        fidelity_eta=fidelity_eta,
+        eval_cache=eval_cache,
+        save_result=save_result,
     )
 
+def cpt_weight(path: str) -> float:
+    """SimPoint weight encoded in a checkpoint file name (<any>_<int>_<float>)"""
+    matchs = re.findall(r'(\d+)_([0-9]*\.?[0-9]+)', path.split("/")[-1])
+    return float(matchs[0][1])
+
+
+def select_cpts(workload_list: list[WorkloadConfig], weight_threshold: float) -> list[WorkloadConfig]:
+    """
+    Restrict every workload to its highest-weight checkpoints.
+
+    Args:
+        workload_list: Workloads whose checkpoints are sorted by weight (highest first), as returned by getcpts
+        weight_threshold: Minimum cumulative weight of checkpoints to keep
+
+    Returns:
+        Workload configurations holding a prefix of the checkpoints of [workload_list]
+    """
+    selected = []
+    for workload in workload_list:
+        cpt_path_list = []
+        cumulative_weight = 0
+        for path in workload.cpt_path_list:
+            if cumulative_weight >= weight_threshold:
+                break
+            cpt_path_list.append(path)
+            cumulative_weight += cpt_weight(path)
+        selected.append(WorkloadConfig(
+            workload_name=workload.workload_name,
+            cpt_path_list=cpt_path_list,
+        ))
+    return selected
+
+
 def getcpts(workloads_path: str, workload_name: str, weight_threshold: float) -> list:
     """
     Get checkpoint paths for a workload that meet a coverage threshold.
@@ -213,31 +327,8 @@ def getcpts(workloads_path: str, workload_name: str, weight_threshold: float) ->
     Returns:
         List of checkpoint paths sorted by weight (highest first)
     """
-    # Find all directories matching the workload pattern
-    workload_dirs = [
-        str(path) for path in pathlib.Path(workloads_path).glob(workload_name)
-        if path.is_dir()
-    ]
-
-    # Find all checkpoint files across these directories
-    checkpoint_paths = []
-    for wl_dir in workload_dirs:
-        paths = [
-            str(path) for ext in ("zstd", "gz")
-            for path in pathlib.Path(wl_dir).glob(f"**/*.{ext}")
-            if path.is_file()
-        ]
-        checkpoint_paths.extend(paths)
-
-    # Extract weights from paths and create (weight, path) pairs
-    weighted_checkpoints = []
-    for path in checkpoint_paths:
-        try:
-            matchs = re.findall(r'(\d+)_([0-9]*\.?[0-9]+)', path.split("/")[-1])
-            weight = float(matchs[0][1])
-            weighted_checkpoints.append({"weight": weight, "path": path})
-        except (IndexError, ValueError):
-            continue  # Skip paths with invalid format
+    # Checkpoints of all directories matching the workload pattern, from the persistent index
+    weighted_checkpoints = cptindex.get_index(workloads_path).lookup(workload_name)
 
     # Sort checkpoints by weight in descending order
     sorted_checkpoints = sorted(
@@ -288,17 +379,79 @@ def load_yaml(config_file: str) -> tuple[EnvironmentConfig, RunningConfig, list[
         output_base_dir=os.path.abspath(config["running"]["output_base_dir"]),
         resume=config["running"]["resume"],
         max_proc_per_server=config["running"]["max_proc_per_server"],
+        watch=config["running"].get("watch", False),
+        scorer=config["running"].get("scorer", "native"),
+        score_workers=config["running"].get("score_workers"),
+        stage_dir=config["running"].get("stage_dir"),
+        stage_limit_gb=config["running"].get("stage_limit_gb", 100),
+        schedule=config["running"].get("schedule", "lpt"),
+        runtime_prior=config["running"].get("runtime_prior") or {},
+        speculate=config["running"].get("speculate"),
+        stall_timeout=config["running"].get("stall_timeout"),
+        max_retries=config["running"].get("max_retries", 2),
+        ledger=config["running"].get("ledger"),
+        job_mem_gb=config["running"].get("job_mem_gb"),
+        mem_reserve_gb=config["running"].get("mem_reserve_gb", 4),
     )
-    workload_list = [
-        WorkloadConfig(
-            workload_name=workload,
-            cpt_path_list=getcpts(
-                config["workloads"]["workloads_path"],
-                workload,
-                config["workloads"]["run_weight"])
+    run.ledger = os.path.abspath(run.ledger or os.path.join(run.output_base_dir, "jobs.sqlite"))
+    run.runtime_history = config["workloads"].get("runtime_history", [run.output_base_dir])
+    if run.scorer not in SCORERS:
+        raise ValueError(f"Unsupported scorer: {run.scorer}, expected one of {SCORERS}")
+    if run.schedule not in SCHEDULES:
+        raise ValueError(f"Unsupported schedule: {run.schedule}, expected one of {SCHEDULES}")
+    if run.speculate is not None and not 0 < run.speculate <= 1:
+        raise ValueError(f"'speculate' must be in (0, 1], got {run.speculate}")
+    if run.stall_timeout is not None and run.stall_timeout <= 0:
+        raise ValueError(f"'stall_timeout' must be positive, got {run.stall_timeout}")
+    if not isinstance(run.max_retries, int) or run.max_retries < 0:
+        raise ValueError(f"'max_retries' must be a non-negative int, got {run.max_retries}")
+    if run.job_mem_gb is not None and run.job_mem_gb <= 0:
+        raise ValueError(f"'job_mem_gb' must be positive, got {run.job_mem_gb}")
+
+    # a server is a name, or a mapping with its name and admission overrides
+    server_list = []
+    for server in config["servers"]:
+        if isinstance(server, dict):
+            server = ServerConfig(**server)
+            run.servers[server.name] = server
+            server_list.append(server.name)
+        else:
+            server_list.append(server)
+
+    # validate or scan all workloads at once before the per-workload lookups
+    cptindex.get_index(config["workloads"]["workloads_path"]).refresh(
+        config["workloads"]["workload_list"])
+
+    # select checkpoints by weight per simulation time instead of by weight only
+    cpu_hour_budget = config["workloads"].get("cpu_hour_budget")
+    if cpu_hour_budget is not None:
+        limits = admission.limits_of(run)
+        plan = cptcost.plan_budget(
+            candidates={
+                workload: getcpts(config["workloads"]["workloads_path"], workload, float("inf"))
+                for workload in config["workloads"]["workload_list"]
+            },
+            run_weight=config["workloads"]["run_weight"],
+            budget_seconds=cpu_hour_budget * 3600,
+            history_dirs=run.runtime_history,
+            slots=sum(limits.max_proc(server) for server in server_list),
         )
-        for workload in config["workloads"]["workload_list"]
-    ]
+        print(plan.format(), end="")
+        workload_list = [
+            WorkloadConfig(workload_name=workload, cpt_path_list=paths)
+            for workload, paths in plan.selected.items()
+        ]
+    else:
+        workload_list = [
+            WorkloadConfig(
+                workload_name=workload,
+                cpt_path_list=getcpts(
+                    config["workloads"]["workloads_path"],
+                    workload,
+                    config["workloads"]["run_weight"])
+            )
+            for workload in config["workloads"]["workload_list"]
+        ]
 
     arch_list = [
         ArchParamConfig(
@@ -309,8 +462,6 @@ def load_yaml(config_file: str) -> tuple[EnvironmentConfig, RunningConfig, list[
         for arch in config["archs"]
     ] if "archs" in config else []
 
-    server_list = config["servers"]
-
     return env, run, workload_list, arch_list, server_list
 
 def print_config(config_file: str):
@@ -346,6 +497,20 @@ def print_config(config_file: str):
     print(f"max_proc_per_server: {run.max_proc_per_server}")
     print(f"output_base_dir:     {run.output_base_dir}")
     print(f"resume:              {run.resume}")
+    print(f"watch:               {run.watch}")
+    print(f"scorer:              {run.scorer}")
+    print(f"score_workers:       {run.score_workers or os.cpu_count()}")
+    print(f"schedule:            {run.schedule}")
+    print(f"ledger:              {run.ledger}")
+    if run.job_mem_gb is not None:
+        print(f"job_mem_gb:          {run.job_mem_gb} (until learned)")
+        print(f"mem_reserve_gb:      {run.mem_reserve_gb}")
+    if run.speculate is not None:
+        print(f"speculate:           {run.speculate}")
+    if run.stall_timeout is not None:
+        print(f"stall_timeout:       {run.stall_timeout}s ({run.max_retries} retries)")
+    if run.stage_dir is not None:
+        print(f"stage_dir:           {run.stage_dir} ({run.stage_limit_gb} GB)")
 
     print_header("Workloads")
     for i, workload in enumerate(workload_list, 1):
@@ -366,7 +531,12 @@ def print_config(config_file: str):
 
     print_header("Servers")
     for i, server in enumerate(server_list, 1):
-        print(f"{i}. {server}")
+        overrides = run.servers.get(server)
+        if overrides is None:
+            print(f"{i}. {server}")
+        else:
+            print(f"{i}. {server} (max_proc={overrides.max_proc}, cores={overrides.cores}, "
+                  f"mem_reserve_gb={overrides.mem_reserve_gb})")
         
 
     try:
@@ -376,6 +546,10 @@ def print_config(config_file: str):
         for param in optConfig.constant_params:
             print(f"  - {param}")
         
+        print(f"Batch Size: {optConfig.batch_size} ({optConfig.batch_strategy})")
+        if optConfig.fidelity_rungs:
+            print(f"Fidelity Rungs: {optConfig.fidelity_rungs} (eta={optConfig.fidelity_eta})")
+
         print("\nParameter Space:")
         for param in optConfig.param_space:
             print(f"  - {param.name}: {param}")
@@ -0,0 +1,172 @@
+import os
+import re
+import heapq
+from dataclasses import dataclass, field
+from datetime import timedelta
+import numpy as np
+
+# Load custom modules
+import checkrun
+import cptindex
+
+# Host time of every statistics dump, each dump covers the time since the last reset
+HOST_SECONDS_RE = re.compile(r'^hostSeconds\s+(\S+)', re.MULTILINE)
+
+
+@dataclass
+class BudgetPlan:
+    """
+    Class to hold the checkpoints selected under a simulation budget
+    """
+    # workload -> checkpoint paths, highest weight first
+    selected: dict[str, list[str]] = field(default_factory=dict)
+    # workload -> summed weight of its selected checkpoints
+    coverage: dict[str, float] = field(default_factory=dict)
+    cpu_seconds: float = 0.0
+    budget_seconds: float = 0.0
+    makespan: float = 0.0
+    slots: int = 1
+    known: int = 0
+
+    def format(self) -> str:
+        n = sum(len(paths) for paths in self.selected.values())
+        lines = [
+            f"Checkpoint budget: {n} checkpoints, {self.known} runtimes from history",
+            f"  coverage: min {min(self.coverage.values(), default=0):.3f}, "
+            f"mean {np.mean(list(self.coverage.values())) if self.coverage else 0:.3f}",
+            f"  cpu hours: {self.cpu_seconds / 3600:.1f} of {self.budget_seconds / 3600:.1f}",
+            f"  estimated makespan: {timedelta(seconds=int(self.makespan))} on {self.slots} slots",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def host_seconds(cpt_dir: str) -> float | None:
+    """Simulation time of a finished checkpoint, summed over the dumps of its stats.txt"""
+    for path in (os.path.join(cpt_dir, "m5out", "stats.txt"), os.path.join(cpt_dir, "stats.txt")):
+        if os.path.isfile(path):
+            with open(path, "r", errors="replace") as f:
+                values = HOST_SECONDS_RE.findall(f.read())
+            try:
+                seconds = sum(float(v) for v in values)
+            except ValueError:
+                return None
+            return seconds if seconds > 0 else None
+    return None
+
+
+def collect_runtimes(history_dirs: list[str], wanted: set[tuple[str, str]]) -> dict[tuple[str, str], float]:
+    """
+    Runtimes of checkpoints simulated by earlier runs.
+
+    Args:
+        history_dirs: Output base directories of earlier runs
+        wanted: (workload, inst) of the checkpoints to look up
+
+    Returns:
+        (workload, inst) -> seconds, from the most recent configuration which completed it
+    """
+    runtimes = {}
+    for base_dir in history_dirs:
+        try:
+            configs = [e for e in os.scandir(base_dir) if e.is_dir()]
+        except OSError:
+            continue
+        configs.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for config_dir in configs:
+            for entry in os.scandir(config_dir.path):
+                match = cptindex.CPT_DIR_RE.match(entry.name)
+                if match is None:
+                    continue
+                key = (match.group(1), match.group(2))
+                if key not in wanted or key in runtimes:
+                    continue
+                # partial or errored runs stopped early, their host time is not a runtime
+                complete, _, total, _ = checkrun.check_run(entry.path)
+                if total == 0 or complete < total:
+                    continue
+                seconds = host_seconds(entry.path)
+                if seconds is not None:
+                    runtimes[key] = seconds
+            if len(runtimes) == len(wanted):
+                return runtimes
+    return runtimes
+
+
+def lpt_makespan(costs: list[float], slots: int) -> float:
+    """Makespan of [costs] on [slots] identical slots, longest processing time first"""
+    loads = [0.0] * max(1, slots)
+    for cost in sorted(costs, reverse=True):
+        heapq.heapreplace(loads, loads[0] + cost)
+    return max(loads)
+
+
+def plan_budget(candidates: dict[str, list[str]], run_weight: float, budget_seconds: float,
+                history_dirs: list[str], slots: int) -> BudgetPlan:
+    """
+    Select the checkpoints covering the most weight within a CPU time budget.
+
+    The highest-weight checkpoint of every workload is always selected, so
+    every workload keeps a score. The others are added by decreasing
+    weight per second of simulation while they fit in the budget and their
+    workload has not reached [run_weight]. Checkpoints without a runtime in
+    the history cost the median runtime of their workload, or of all known
+    checkpoints.
+
+    Args:
+        candidates: workload -> all its checkpoint paths
+        run_weight: Coverage at which a workload stops taking checkpoints
+        budget_seconds: CPU time of one configuration over all workloads
+        history_dirs: Output base directories of earlier runs
+        slots: Number of simulations running at the same time
+
+    Returns:
+        BudgetPlan with the selection and its estimated cost and makespan
+    """
+    rows = []
+    for workload, paths in candidates.items():
+        for path in paths:
+            matchs = cptindex.CPT_NAME_RE.findall(os.path.basename(path))
+            rows.append((workload, path, matchs[0][0], float(matchs[0][1])))
+
+    runtimes = collect_runtimes(history_dirs, {(w, inst) for w, _, inst, _ in rows})
+    weight = np.array([r[3] for r in rows], dtype=float)
+    cost = np.array([runtimes.get((r[0], r[2]), np.nan) for r in rows], dtype=float)
+    known = ~np.isnan(cost)
+
+    # estimate the missing runtimes
+    fallback = float(np.median(cost[known])) if known.any() else 1.0
+    workloads = np.array([r[0] for r in rows])
+    for workload in candidates:
+        mask = workloads == workload
+        known_here = cost[mask & known]
+        cost[mask & ~known] = float(np.median(known_here)) if len(known_here) else fallback
+
+    plan = BudgetPlan(budget_seconds=budget_seconds, slots=slots, known=int(known.sum()))
+    chosen = np.zeros(len(rows), dtype=bool)
+    coverage = {workload: 0.0 for workload in candidates}
+
+    # the highest-weight checkpoint of every workload
+    for workload in candidates:
+        index = np.flatnonzero(workloads == workload)
+        if len(index):
+            best = index[np.argmax(weight[index])]
+            chosen[best] = True
+            coverage[workload] += float(weight[best])
+    spent = float(cost[chosen].sum())
+
+    for i in np.argsort(-weight / np.maximum(cost, 1e-9), kind="stable"):
+        workload = rows[i][0]
+        if chosen[i] or coverage[workload] >= run_weight or spent + cost[i] > budget_seconds:
+            continue
+        chosen[i] = True
+        coverage[workload] += float(weight[i])
+        spent += float(cost[i])
+
+    for workload in candidates:
+        index = np.flatnonzero(chosen & (workloads == workload))
+        index = index[np.argsort(-weight[index], kind="stable")]
+        plan.selected[workload] = [rows[i][1] for i in index]
+    plan.coverage = coverage
+    plan.cpu_seconds = spent
+    plan.makespan = lpt_makespan(list(cost[chosen]), slots)
+    return plan
@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import fnmatch
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+INDEX_VERSION = 1
+
+# Index file written next to the checkpoints when the archive is writable
+INDEX_NAME = ".cpt_index.json"
+
+# Fallback location, one index per archive
+USER_CACHE = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "xs-gem5-bayesian-scripts")
+
+CPT_EXTS = (".zstd", ".gz")
+
+# <any>_<inst>_<weight> in a checkpoint file name
+CPT_NAME_RE = re.compile(r'(\d+)_([0-9]*\.?[0-9]+)')
+
+# Checkpoint output directory: <workload>_<inst>_<weight>
+CPT_DIR_RE = re.compile(r'^(.+)_(\d+)_([0-9]*\.?[0-9]+)$')
+
+# Parallel directory scans, NFS latency bound
+SCAN_WORKERS = 32
+
+
+def scan_workload(path: str) -> dict:
+    """
+    Walk one workload directory.
+
+    Returns:
+        {"dirs": {directory: mtime_ns}, "cpts": [{"inst", "weight", "path"}]}
+    """
+    dirs = {}
+    cpts = []
+    stack = [path]
+    while stack:
+        directory = stack.pop()
+        try:
+            dirs[directory] = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.endswith(CPT_EXTS) and entry.is_file():
+                matchs = CPT_NAME_RE.findall(entry.name)
+                if not matchs:
+                    continue  # Skip paths with invalid format
+                cpts.append({
+                    "inst": int(matchs[0][0]),
+                    "weight": float(matchs[0][1]),
+                    "path": entry.path,
+                })
+    return {"dirs": dirs, "cpts": cpts}
+
+
+def is_fresh(entry: dict) -> bool:
+    """Whether no directory of an indexed workload changed since it was scanned"""
+    for directory, mtime_ns in entry["dirs"].items():
+        try:
+            if os.stat(directory).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class CptIndex:
+    """
+    Persistent index of the checkpoints of one workloads_path
+
+    Holds workload, inst count, weight and path of every checkpoint. Each
+    workload directory is rescanned only when one of its directories has
+    a new mtime, and workloads are validated or scanned in parallel, so
+    loading a configuration costs stats instead of recursive globs.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        # workload directory name -> scan_workload result
+        self.workloads: dict[str, dict] = {}
+        # workloads validated by this process
+        self._checked: set[str] = set()
+        # (mtime_ns of the root, its workload directory names), listed again once the root changes
+        self._listing: tuple[int, list[str]] | None = None
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _index_paths(self) -> list[str]:
+        digest = hashlib.sha1(self.root.encode()).hexdigest()[:16]
+        return [os.path.join(self.root, INDEX_NAME),
+                os.path.join(USER_CACHE, f"cpt_index_{digest}.json")]
+
+    def _load(self):
+        for path in self._index_paths():
+            try:
+                with open(path, "r") as f:
+                    index = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if index.get("version") == INDEX_VERSION and index.get("root") == self.root:
+                self.workloads = index["workloads"]
+                return
+
+    def save(self):
+        """Write the index if it changed, next to the archive or in the user cache"""
+        if not self._dirty:
+            return
+        index = {"version": INDEX_VERSION, "root": self.root, "workloads": self.workloads}
+        for path in self._index_paths():
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, "w") as f:
+                    json.dump(index, f)
+                os.replace(tmp_path, path)
+                self._dirty = False
+                if self._listing is not None and os.path.dirname(path) == self.root:
+                    # the index file is no workload, keep the listing
+                    self._listing = (os.stat(self.root).st_mtime_ns, self._listing[1])
+                return
+            except OSError:
+                continue
+
+    def _refresh_one(self, name: str):
+        entry = self.workloads.get(name)
+        if entry is None or not is_fresh(entry):
+            entry = scan_workload(os.path.join(self.root, name))
+            with self._lock:
+                self.workloads[name] = entry
+                self._dirty = True
+        with self._lock:
+            self._checked.add(name)
+
+    def names(self) -> list[str]:
+        """Workload directories of the archive, listed once while the root is unchanged"""
+        try:
+            mtime_ns = os.stat(self.root).st_mtime_ns
+            if self._listing is None or self._listing[0] != mtime_ns:
+                self._listing = (mtime_ns, [entry.name for entry in os.scandir(self.root) if entry.is_dir()])
+        except OSError:
+            return []
+        return self._listing[1]
+
+    def match(self, pattern: str) -> list[str]:
+        """Workload directories of the archive matching a glob pattern"""
+        return sorted(fnmatch.filter(self.names(), pattern))
+
+    def refresh(self, patterns: list[str]):
+        """Validate, and rescan if needed, every workload matching [patterns] in parallel"""
+        self._refresh_names({name for pattern in patterns for name in self.match(pattern)})
+
+    def _refresh_names(self, names: set[str]):
+        names = names - self._checked
+        if names:
+            with ThreadPoolExecutor(max_workers=min(SCAN_WORKERS, len(names))) as pool:
+                list(pool.map(self._refresh_one, sorted(names)))
+        self.save()
+
+    def lookup(self, pattern: str) -> list[dict]:
+        """
+        Checkpoints of the workloads matching a glob pattern.
+
+        Returns:
+            [{"workload", "inst", "weight", "path"}] in no particular order
+        """
+        names = self.match(pattern)
+        self._refresh_names(set(names))
+        return [
+            {"workload": name, **cpt}
+            for name in names
+            for cpt in self.workloads.get(name, {"cpts": []})["cpts"]
+        ]
+
+
+_INDEXES: dict[str, CptIndex] = {}
+
+
+def get_index(root: str) -> CptIndex:
+    """Return the CptIndex of [root], loaded on first use"""
+    root = os.path.abspath(root)
+    if root not in _INDEXES:
+        _INDEXES[root] = CptIndex(root)
+    return _INDEXES[root]
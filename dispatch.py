@@ -0,0 +1,480 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+import dataclasses
+from dataclasses import dataclass
+from tqdm import tqdm
+
+# Load custom modules
+import admission
+import ledger
+import remote
+import localrun
+
+
+@dataclass
+class Job:
+    """
+    Class to hold one gem5 run of a checkpoint
+    """
+    arch_name: str
+    workload_name: str
+    cpt: str
+    output_dir: str
+    cmd: str
+    server: str | None = None
+    pid: int | None = None
+    # expected peak memory in bytes, see admission.estimate
+    mem: int = 0
+
+
+@dataclass
+class Capacity:
+    """
+    Class to hold what a server can take right now
+    """
+    slots: int
+    # memory in bytes the new jobs may take together
+    memory: float = math.inf
+
+
+def free_slots(status: remote.ServerStatus, max_proc_per_server: int) -> int:
+    """
+    Number of jobs a server can take right now.
+
+    Mirrors the admission rule of remote.check_load_and_run (a server accepts
+    jobs while running <= max_proc_per_server and load < cores/2), but counts
+    how many jobs fit instead of answering for a single one. Running jobs are
+    the live PIDs of our jobs, see ServerMonitor.
+
+    Args:
+        status: Result of remote.probe_server
+        max_proc_per_server: Max number of processes per server
+
+    Returns:
+        Number of free slots, 0 if the server is full
+    """
+    if status.load >= status.cores / 2:
+        return 0
+    return max(0, min(max_proc_per_server + 1 - status.running,
+                      math.ceil(status.cores / 2 - status.load)))
+
+
+# Seconds a probe is reused for liveness checks, so every check of one poll shares it
+PROBE_TTL = 5
+
+
+def probe_local(pids: list[int], exec: str) -> remote.ServerStatus:
+    """Status of the current machine and of [pids] on it, as remote.probe_server"""
+    rss = localrun.rss(sorted(localrun.POOL.alive(pids)), exec)
+    return remote.ServerStatus(
+        server=localrun.LOCAL_SERVER,
+        running=len(rss),
+        load=os.getloadavg()[0],
+        cores=os.cpu_count() or 1,
+        mem_available=localrun.mem_available(),
+        alive=set(rss),
+        rss=rss,
+    )
+
+
+class ServerMonitor:
+    """
+    Latest probe of every server and the PIDs of the jobs launched on it
+
+    One probe returns the load, cores and free memory of a server together
+    with which of our jobs on it are still alive and their resident memory,
+    so dispatching and all liveness checks of a poll cost one round-trip
+    per server, whatever the number of jobs. PIDs seen dead are no longer
+    probed, the peak memory seen of every job is kept for the ledger.
+
+    Jobs a dispatch round assigned to a server hold their slot from the
+    assignment until their PID is seen dead: claimed while they launch,
+    then tracked. Concurrent dispatchers (e.g. the issuing threads of a
+    batch) count each other's jobs this way, whatever their last probe saw.
+    """
+
+    def __init__(self):
+        # server -> PIDs of our jobs not seen dead yet
+        self._pids: dict[str, set[int]] = {}
+        # server -> (time of the probe, probed PIDs, status)
+        self._status: dict[str, tuple[float, set[int], remote.ServerStatus]] = {}
+        # (server, pid) -> peak resident memory seen in bytes
+        self._peak: dict[tuple[str, int], int] = {}
+        # (server, pid) -> memory expected of the job, see admission.estimate
+        self._expected: dict[tuple[str, int], int] = {}
+        # server -> jobs assigned by a dispatch round and not launched yet
+        self._claimed: dict[str, list[Job]] = {}
+        self._lock = threading.Lock()
+        # held by a dispatch round from counting the free slots until claiming them
+        self.admitting = threading.Lock()
+
+    def track_pids(self, server: str, pids: list[int]):
+        """Probe the liveness of [pids] on [server] from now on"""
+        with self._lock:
+            self._pids.setdefault(server, set()).update(pids)
+
+    def track(self, jobs: list[Job]):
+        """Probe the liveness of launched remote jobs from now on"""
+        for job in jobs:
+            if job.server is not None and job.pid is not None:
+                self.track_pids(job.server, [job.pid])
+
+    def claim(self, server: str, jobs: list[Job]):
+        """Hold slots of [server] for [jobs] while they are launched"""
+        with self._lock:
+            self._claimed.setdefault(server, []).extend(jobs)
+
+    def release(self, server: str, jobs: list[Job], launched: list[Job] = ()):
+        """Hand back the slots claimed for [jobs], those of the [launched] ones are held by their PID from now on"""
+        with self._lock:
+            self._pids.setdefault(server, set()).update(job.pid for job in launched)
+            self._expected.update({(server, job.pid): job.mem for job in launched})
+            released = {id(job) for job in jobs}
+            self._claimed[server] = [job for job in self._claimed.get(server, ()) if id(job) not in released]
+
+    def ours(self, server: str, status: remote.ServerStatus) -> tuple[int, int]:
+        """
+        Our jobs on [server], live or being launched.
+
+        Returns:
+            (number of jobs, memory in bytes they are still expected to take
+            beyond their sample in [status])
+        """
+        with self._lock:
+            pids = set(self._pids.get(server, ()))
+            claimed = list(self._claimed.get(server, ()))
+            growth = sum(max(0, self._expected.get((server, pid), 0) - status.rss.get(pid, 0))
+                         for pid in pids)
+        return len(pids) + len(claimed), growth + sum(job.mem for job in claimed)
+
+    def status(self, server: str, exec: str, max_age: float = 0) -> remote.ServerStatus | None:
+        """
+        Status of [server], probed again unless the last probe is recent and covered every tracked PID.
+
+        Returns:
+            ServerStatus, None if the server can not be reached
+        """
+        with self._lock:
+            pids = set(self._pids.get(server, ()))
+            cached = self._status.get(server)
+        if cached is not None and time.time() - cached[0] <= max_age and pids <= cached[1]:
+            return cached[2]
+
+        if server == localrun.LOCAL_SERVER:
+            status = probe_local(sorted(pids), exec)
+        else:
+            status = remote.probe_server(server, exec, sorted(pids))
+        if status is None:
+            return None
+        with self._lock:
+            # keep PIDs tracked while the probe ran
+            self._pids[server] = (self._pids.get(server, set()) - pids) | status.alive
+            for pid in pids - status.alive:
+                self._expected.pop((server, pid), None)
+            self._status[server] = (time.time(), pids, status)
+            for pid, rss in status.rss.items():
+                self._peak[(server, pid)] = max(rss, self._peak.get((server, pid), 0))
+        return status
+
+    def peak_rss(self, server: str, pid: int) -> int | None:
+        """Peak resident memory seen of a job in bytes, forgotten once read"""
+        with self._lock:
+            return self._peak.pop((server, pid), None)
+
+
+MONITOR = ServerMonitor()
+
+
+class Dispatcher:
+    """
+    Distribute jobs over a pool of servers
+
+    Every round probes all servers concurrently, then assigns queued jobs
+    round-robin over the free slots and launches them concurrently. The
+    dispatcher only waits when no server has a free slot.
+    """
+
+    def __init__(self, server_list: list[str], exec: str,
+                 max_proc_per_server: int, retry_interval: int = 5, record: bool = True):
+        """
+        Args:
+            server_list: List of server names or IP addresses
+            exec: Executable name counted as running jobs
+            max_proc_per_server: Max number of processes per server
+            retry_interval: Time to wait in seconds when every server is full
+            record: Record the launched jobs in the job ledger, if one is open
+        """
+        self.server_list = server_list
+        self.record = record
+        self.exec = exec
+        self.max_proc_per_server = max_proc_per_server
+        self.retry_interval = retry_interval
+        self.pool = ThreadPoolExecutor(max_workers=max(1, len(server_list)))
+        # the last round placed nothing although servers had free slots, for lack of memory
+        self.memory_blocked = False
+
+    def probe(self, server: str) -> remote.ServerStatus | None:
+        """Fresh status of [server], None if it can not be reached"""
+        return MONITOR.status(server, self.exec)
+
+    def probe_all(self, exclude: set[str] | None = None) -> dict[str, remote.ServerStatus]:
+        """
+        Probe all servers concurrently.
+
+        Args:
+            exclude: Servers to leave out
+
+        Returns:
+            Mapping from server to its status, without the unreachable servers
+        """
+        servers = [server for server in self.server_list if not exclude or server not in exclude]
+        statuses = self.pool.map(self.probe, servers)
+        return {
+            server: status for server, status in zip(servers, statuses)
+            if status is not None
+        }
+
+    def free(self, server: str, status: remote.ServerStatus) -> Capacity:
+        """
+        What [server] can take according to its [status], once our jobs on it are counted.
+
+        The local backend is a process pool of max_proc_per_server processes,
+        remote servers follow free_slots. Our jobs count as running from their
+        assignment on, see ServerMonitor. Once admission limits are
+        configured, the per-server overrides apply, and with memory admission
+        the new jobs also have to fit in the free memory left by the reserve
+        and by the growth of our running jobs.
+        """
+        limits = admission.LIMITS
+        max_proc = limits.max_proc(server) if limits is not None else self.max_proc_per_server
+        running, growth = MONITOR.ours(server, status)
+        if server == localrun.LOCAL_SERVER:
+            slots = max(0, max_proc - max(running, localrun.POOL.running()))
+        else:
+            # the other processes the probe counted, plus ours whether the probe saw them or not
+            status = dataclasses.replace(
+                status, running=status.running - len(status.alive) + running,
+                cores=limits.cores(server, status.cores) if limits is not None else status.cores)
+            slots = free_slots(status, max_proc)
+        if not admission.enabled():
+            return Capacity(slots)
+        return Capacity(slots, admission.free_memory(status, growth, limits.reserve(server)))
+
+    def assign(self, queue: deque, capacity: dict[str, Capacity]) -> dict[str, list[Job]]:
+        """
+        Pop jobs from [queue] round-robin over the servers with free slots.
+
+        A job goes to the next server in turn with a free slot and enough
+        memory for it. Jobs which fit no server stay in [queue] in order.
+
+        Returns:
+            Mapping from server to the jobs assigned to it
+        """
+        capacity = {server: dataclasses.replace(c) for server, c in capacity.items()}
+        servers = [server for server in self.server_list if server in capacity]
+        assignments = {server: [] for server in servers}
+        skipped = []
+        turn = 0
+        while queue and any(c.slots > 0 for c in capacity.values()):
+            job = queue.popleft()
+            for i in range(len(servers)):
+                server = servers[(turn + i) % len(servers)]
+                c = capacity[server]
+                if c.slots > 0 and job.mem <= c.memory:
+                    assignments[server].append(job)
+                    c.slots -= 1
+                    c.memory -= job.mem
+                    turn = (turn + i + 1) % len(servers)
+                    break
+            else:
+                skipped.append(job)
+        queue.extendleft(reversed(skipped))
+        return {server: jobs for server, jobs in assignments.items() if jobs}
+
+    def launch(self, server: str, jobs: list[Job]) -> list[Job]:
+        """
+        Launch [jobs] on [server] in one round-trip and record their PIDs.
+
+        Returns:
+            Jobs which failed to launch
+        """
+        cmds = [job.cmd for job in jobs]
+        if server == localrun.LOCAL_SERVER:
+            pids = localrun.POOL.launch_batch(cmds)
+        else:
+            pids = remote.launch_batch(server, cmds)
+        for job, pid in zip(jobs, pids):
+            job.server = server
+            job.pid = pid
+        return jobs[len(pids):]
+
+    def dispatch_round(self, queue: deque, exclude: set[str] | None = None) -> list[Job]:
+        """
+        Launch as many jobs of [queue] as the servers can take right now.
+
+        Jobs which failed to launch are put back at the front of [queue].
+
+        Args:
+            queue: Jobs to launch
+            exclude: Servers which must not take any job of this round
+
+        Returns:
+            List of jobs launched in this round
+        """
+        if not queue:
+            return []
+        admission.estimate(queue)
+        statuses = self.probe_all(exclude)
+        with MONITOR.admitting:
+            capacity = {server: self.free(server, status) for server, status in statuses.items()}
+            assignments = self.assign(queue, capacity)
+            for server, server_jobs in assignments.items():
+                MONITOR.claim(server, server_jobs)
+        self.memory_blocked = not assignments and any(c.slots > 0 for c in capacity.values())
+
+        futures = {
+            server: self.pool.submit(self.launch, server, server_jobs)
+            for server, server_jobs in assignments.items()
+        }
+
+        launched = []
+        try:
+            for server, future in futures.items():
+                failed = future.result()
+                server_jobs = assignments[server]
+                placed = server_jobs[:len(server_jobs) - len(failed)]
+                MONITOR.release(server, server_jobs, placed)
+                for job in placed:
+                    launched.append(job)
+                    tqdm.write(
+                        f"Distribute to {server} with cpt dir: {job.output_dir}")
+                # retry failed jobs first in the next round
+                queue.extendleft(reversed(failed))
+        finally:
+            for server, server_jobs in assignments.items():
+                MONITOR.release(server, server_jobs)
+
+        if self.record and launched and ledger.LEDGER is not None:
+            ledger.LEDGER.launched(launched)
+        return launched
+
+    def relaunch(self, queue: deque) -> list[Job]:
+        """
+        Launch killed or lost jobs again, each on another server than the one recorded in it.
+
+        The jobs are updated in place with their new server and PID. Jobs
+        which found no slot stay in [queue]. With a single server, jobs go
+        back to it.
+
+        Returns:
+            List of jobs launched again
+        """
+        by_server: dict[str | None, deque] = {}
+        while queue:
+            job = queue.popleft()
+            server = job.server if len(self.server_list) > 1 else None
+            by_server.setdefault(server, deque()).append(job)
+
+        launched = []
+        for server, jobs in by_server.items():
+            launched += self.dispatch_round(jobs, {server} if server else None)
+            queue.extend(jobs)
+        return launched
+
+    def dispatch(self, jobs: list[Job], desc: str = "Issuing",
+                 cancel: Callable[[list[Job]], set[str]] | None = None) -> list[Job]:
+        """
+        Launch every job, waiting for free slots when the servers are full.
+
+        Args:
+            jobs: Jobs to launch
+            desc: Description of the progress bar
+            cancel: Called before every round with the jobs launched since its
+                    last call, returns the configurations whose queued jobs are
+                    dropped. Called once more with the jobs of the last round.
+
+        Returns:
+            List of launched jobs
+        """
+        queue = deque(jobs)
+        launched = []
+        placed = []
+        warned = False
+
+        with tqdm(total=len(jobs), desc=desc, leave=False, unit="checkpoint", dynamic_ncols=True) as bar:
+            while queue:
+                # right before placing, so failures found while waiting stop their configuration first
+                if cancel is not None:
+                    cancelled = cancel(placed)
+                    if cancelled:
+                        kept = deque(job for job in queue if job.arch_name not in cancelled)
+                        bar.total -= len(queue) - len(kept)
+                        queue = kept
+                        if not queue:
+                            placed = []
+                            break
+
+                placed = self.dispatch_round(queue)
+                launched += placed
+                bar.update(len(placed))
+
+                # every server is full, wait for running jobs to finish
+                if queue and not placed:
+                    if self.memory_blocked and not warned:
+                        tqdm.write(f"! Waiting for memory: no server has {queue[0].mem / admission.GB:.1f} GB "
+                                   f"free above mem_reserve_gb, see job_mem_gb")
+                        warned = True
+                    time.sleep(self.retry_interval)
+
+        if cancel is not None and placed:
+            cancel(placed)
+        return launched
+
+    def kill(self, jobs: list[Job]):
+        """Kill launched jobs through their recorded server and PID"""
+        pids: dict[str, list[int]] = {}
+        for job in jobs:
+            if job.server is not None and job.pid is not None:
+                pids.setdefault(job.server, []).append(job.pid)
+        for server, server_pids in pids.items():
+            if server == localrun.LOCAL_SERVER:
+                localrun.POOL.kill(server_pids)
+            else:
+                remote.kill_pids(server, server_pids)
+
+    def alive(self, jobs: list[Job]) -> set[tuple[str, int]]:
+        """
+        Check which launched jobs are still running.
+
+        Remote servers are probed at most once per PROBE_TTL for all
+        checks together, see ServerMonitor.
+
+        Returns:
+            (server, pid) of the running jobs, jobs on unreachable servers count as running
+        """
+        MONITOR.track(jobs)
+        pids: dict[str, list[int]] = {}
+        for job in jobs:
+            if job.server is not None and job.pid is not None:
+                pids.setdefault(job.server, []).append(job.pid)
+
+        def check(server: str) -> set[int]:
+            if server == localrun.LOCAL_SERVER:
+                return localrun.POOL.alive(pids[server])
+            status = MONITOR.status(server, self.exec, PROBE_TTL)
+            return set(pids[server]) if status is None else status.alive
+
+        servers = list(pids)
+        return {
+            (server, pid)
+            for server, alive in zip(servers, self.pool.map(check, servers))
+            for pid in alive
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False)
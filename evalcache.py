@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import hashlib
+
+# Load custom modules
+import config
+import scorer
+
+# gem5 binary path -> ((size, mtime_ns), digest)
+_BINARY_DIGESTS: dict[str, tuple[tuple[int, int], str]] = {}
+
+
+def binary_digest(path: str) -> str:
+    """
+    SHA-256 of a gem5 binary, computed once per process while the file is unchanged.
+
+    A binary which is not readable from this machine is identified by its path only.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return f"path:{path}"
+
+    signature = (st.st_size, st.st_mtime_ns)
+    cached = _BINARY_DIGESTS.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    _BINARY_DIGESTS[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def eval_key(gem5_bin: str, arch: config.ArchParamConfig,
+             workload_list: list[config.WorkloadConfig]) -> str:
+    """
+    Content address of one evaluation.
+
+    Args:
+        gem5_bin: gem5 binary the configuration runs with
+        arch: Configuration, its name is not part of the key
+        workload_list: Workloads and checkpoints the configuration runs
+
+    Returns:
+        Hex digest identifying the binary, script, params and checkpoint set
+    """
+    content = {
+        "gem5_bin": binary_digest(gem5_bin),
+        "script_path": arch.script_path,
+        "script_params": arch.script_params,
+        "cpts": {w.workload_name: sorted(w.cpt_path_list) for w in workload_list},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def make_entry(arch_name: str, score: float, result: scorer.ScoreResult | None = None) -> dict:
+    """
+    Outcome of an evaluation, as stored in the cache.
+
+    Args:
+        arch_name: Output directory name of the configuration
+        score: Estimated Int score per GHz
+        result: Per-workload metrics, if scored natively
+
+    Returns:
+        JSON serializable entry
+    """
+    entry = {
+        "arch_name": arch_name,
+        "score": score,
+        "time": time.time(),
+    }
+    if result is not None:
+        entry["workloads"] = {
+            name: {"cpi": w.cpi, "coverage": w.coverage, "time": w.time}
+            for name, w in result.workloads.items()
+        }
+        entry["int_scores"] = result.int_scores
+        entry["fp_scores"] = result.fp_scores
+    return entry
+
+
+class EvalCache:
+    """
+    Persistent cache of evaluated configurations
+
+    One JSON file per evaluation named after its eval_key, holding the
+    score and the per-workload metrics. Files are written atomically, so
+    a crashed or concurrent campaign never leaves a partial entry.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def get(self, key: str) -> dict | None:
+        """Cached entry of [key], None if the evaluation never finished"""
+        try:
+            with open(self._entry_path(key), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def put(self, key: str, entry: dict):
+        """Store the entry of a finished evaluation, see make_entry"""
+        tmp_path = f"{self._entry_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f, indent=2)
+        os.replace(tmp_path, self._entry_path(key))
@@ -0,0 +1,68 @@
+import os
+import json
+import numpy as np
+
+
+def _to_json(value):
+    # skopt returns numpy scalars for Integer/Real dimensions
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class Journal:
+    """
+    Append-only JSONL record of the evaluations of an optimization
+
+    Every evaluation is written once as one line and synced to disk, so the
+    cost of a checkpoint does not grow with the number of evaluations and a
+    crash loses at most the line being written, which read() skips.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._repaired = False
+
+    def _repair(self):
+        # terminate a torn last line so the next record starts on its own line
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb+") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        self._repaired = True
+
+    def append(self, record: dict):
+        """Append one evaluation record"""
+        if not self._repaired:
+            self._repair()
+        line = json.dumps(record, default=_to_json) + "\n"
+        with open(self.path, "a") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read(self):
+        """
+        Stream the recorded evaluations.
+
+        Yields:
+            Evaluation records in the order they were appended
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # torn last line of a crashed run
+                    continue
+
+    def history(self) -> tuple[list[list], list[float]]:
+        """Points and objective values recorded so far, to resume an optimizer"""
+        x_iters, func_vals = [], []
+        for record in self.read():
+            x_iters.append(record["x"])
+            func_vals.append(record["y"])
+        return x_iters, func_vals
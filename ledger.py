@@ -0,0 +1,196 @@
+import os
+import time
+import sqlite3
+import threading
+import argparse
+
+# Job states, a job is running from its launch until the monitor sees it end
+RUNNING = "running"
+COMPLETE = "complete"
+ERROR = "error"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    output_dir TEXT PRIMARY KEY,
+    config     TEXT NOT NULL,
+    workload   TEXT NOT NULL,
+    cpt        TEXT NOT NULL,
+    server     TEXT,
+    pid        INTEGER,
+    start      REAL,
+    end        REAL,
+    state      TEXT NOT NULL,
+    error      TEXT,
+    attempts   INTEGER NOT NULL DEFAULT 0,
+    rss        INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_config_state ON jobs (config, state);
+CREATE INDEX IF NOT EXISTS jobs_workload ON jobs (workload);
+CREATE INDEX IF NOT EXISTS jobs_server ON jobs (server);
+"""
+
+# Columns runtimes() can group by
+GROUPS = ("config", "workload", "server")
+
+
+class Ledger:
+    """
+    SQLite record of every simulation issued
+
+    One row per checkpoint output directory holds the server, PID and
+    start time of its last launch, the number of launches, and once the
+    monitor saw it end, its end time, terminal state, error line and peak
+    resident memory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # jobs are launched from the issuing threads of the optimizer and updated by the monitor
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def launched(self, jobs: list):
+        """Record the launch of dispatch.Jobs, a relaunch resets the end and state"""
+        now = time.time()
+        rows = [(job.output_dir, job.arch_name, job.workload_name, job.cpt, job.server, job.pid, now)
+                for job in jobs]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO jobs (output_dir, config, workload, cpt, server, pid, start, state, attempts) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?, '{RUNNING}', 1) "
+                "ON CONFLICT (output_dir) DO UPDATE SET "
+                "config = excluded.config, workload = excluded.workload, cpt = excluded.cpt, "
+                "server = excluded.server, pid = excluded.pid, start = excluded.start, "
+                f"end = NULL, state = '{RUNNING}', error = NULL, rss = NULL, attempts = attempts + 1",
+                rows)
+
+    def running(self, config_name: str) -> dict[str, tuple[str, int]]:
+        """Output directory -> (server, pid) of the jobs of a configuration not seen ending yet"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT output_dir, server, pid FROM jobs WHERE config = ? AND state = ?",
+                (config_name, RUNNING)).fetchall()
+        return {output_dir: (server, pid) for output_dir, server, pid in rows}
+
+    def running_pids(self) -> dict[str, list[int]]:
+        """Server -> PIDs of the jobs not seen ending, e.g. launched before a restart"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT server, pid FROM jobs WHERE state = ? AND pid IS NOT NULL", (RUNNING,)).fetchall()
+        pids: dict[str, list[int]] = {}
+        for server, pid in rows:
+            pids.setdefault(server, []).append(pid)
+        return pids
+
+    def states(self, config_name: str) -> dict[str, str]:
+        """Output directory -> state of every recorded job of a configuration"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT output_dir, state FROM jobs WHERE config = ?", (config_name,)).fetchall()
+        return dict(rows)
+
+    def ended(self, results: list[tuple[str, str, str | None, int | None]]):
+        """
+        Record the end of running jobs.
+
+        Args:
+            results: (output directory, COMPLETE or ERROR, error line or None, peak memory in bytes or None)
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, error = ?, rss = ?, end = ? WHERE output_dir = ? AND state = ?",
+                [(state, error, rss, now, output_dir, RUNNING) for output_dir, state, error, rss in results])
+
+    def peak_rss(self, config_name: str, workload: str) -> int | None:
+        """
+        Peak memory of the completed jobs of a configuration, else of a workload under any configuration.
+
+        Returns:
+            Bytes, None if no such job recorded its memory
+        """
+        with self._lock:
+            for column, value in (("config", config_name), ("workload", workload)):
+                peak = self._conn.execute(
+                    f"SELECT MAX(rss) FROM jobs WHERE {column} = ? AND state = ?",
+                    (value, COMPLETE)).fetchone()[0]
+                if peak is not None:
+                    return peak
+        return None
+
+    def runtimes(self, by: str, config_name: str | None = None) -> list[tuple]:
+        """
+        Runtime of the completed jobs grouped by config, workload or server.
+
+        Returns:
+            [(group, jobs, mean seconds, max seconds)], slowest mean first
+        """
+        if by not in GROUPS:
+            raise ValueError(f"Unsupported group: {by}, expected one of {GROUPS}")
+        where, params = f"state = '{COMPLETE}'", []
+        if config_name is not None:
+            where += " AND config = ?"
+            params.append(config_name)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT {by}, COUNT(*), AVG(end - start), MAX(end - start) FROM jobs "
+                f"WHERE {where} GROUP BY {by} ORDER BY AVG(end - start) DESC", params).fetchall()
+
+    def jobs(self, config_name: str | None = None, state: str | None = None) -> list[tuple]:
+        """(output_dir, server, pid, start, end, state, attempts, error) of the matching jobs"""
+        where, params = [], []
+        if config_name is not None:
+            where.append("config = ?")
+            params.append(config_name)
+        if state is not None:
+            where.append("state = ?")
+            params.append(state)
+        query = "SELECT output_dir, server, pid, start, end, state, attempts, error FROM jobs"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        with self._lock:
+            return self._conn.execute(query + " ORDER BY start", params).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# Ledger every dispatcher records its launches in, see open_ledger
+LEDGER: Ledger | None = None
+
+
+def open_ledger(path: str) -> Ledger:
+    """Open the ledger at [path] as LEDGER, reusing it if already open"""
+    global LEDGER
+    if LEDGER is None or LEDGER.path != path:
+        if LEDGER is not None:
+            LEDGER.close()
+        LEDGER = Ledger(path)
+    return LEDGER
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the job ledger of a run")
+    parser.add_argument("ledger", help="Ledger file, e.g. <output_base_dir>/jobs.sqlite")
+    parser.add_argument("--by", choices=GROUPS, default=None,
+                        help="Print the runtime of completed jobs per config, workload or server")
+    parser.add_argument("--config", type=str, default=None, help="Only jobs of this configuration")
+    parser.add_argument("--state", choices=[RUNNING, COMPLETE, ERROR], default=None,
+                        help="Only jobs in this state")
+    args = parser.parse_args()
+
+    ledger = Ledger(args.ledger)
+    if args.by is not None:
+        print(f"{args.by:<40} {'jobs':>6} {'mean':>10} {'max':>10}")
+        for group, count, mean, longest in ledger.runtimes(args.by, args.config):
+            print(f"{group:<40} {count:>6} {mean:>10.0f} {longest:>10.0f}")
+    else:
+        for output_dir, server, pid, start, end, state, attempts, error in ledger.jobs(args.config, args.state):
+            started = time.strftime("%m-%d %H:%M:%S", time.localtime(start)) if start else "-"
+            runtime = f"{end - start:.0f}s" if end and start else "-"
+            print(f"{state:<8} {server or '-':<16} {pid or '-':>8} {started} {runtime:>8} x{attempts} {output_dir}"
+                  + (f"  {error}" if error else ""))
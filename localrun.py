@@ -0,0 +1,104 @@
+import os
+import signal
+import subprocess
+import threading
+
+# Server name selecting the local backend in the `servers` section
+LOCAL_SERVER = "local"
+
+
+class LocalPool:
+    """
+    Bounded pool of background processes on the current machine
+
+    Runs the same shell command lines the SSH backend sends to remote
+    servers, without any SSH connection. The pool size is enforced by the
+    dispatcher, see dispatch.Dispatcher.free.
+    """
+
+    def __init__(self):
+        self._procs: list[subprocess.Popen] = []
+        self._lock = threading.Lock()
+
+    def running(self) -> int:
+        """Number of launched processes which have not exited yet"""
+        with self._lock:
+            self._procs = [proc for proc in self._procs if proc.poll() is None]
+            return len(self._procs)
+
+    def launch_batch(self, cmds: list[str]) -> list[int]:
+        """
+        Launch commands as detached background processes
+
+        Args:
+            cmds: Shell commands to launch, without a trailing `&`
+
+        Returns:
+            PIDs of the launched commands in the order of [cmds]
+        """
+        pids = []
+        for cmd in cmds:
+            proc = subprocess.Popen(
+                ["bash", "-c", cmd],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            with self._lock:
+                self._procs.append(proc)
+            pids.append(proc.pid)
+        return pids
+
+    def kill(self, pids: list[int]):
+        """Kill launched processes with their children, ignoring those which already exited"""
+        for pid in pids:
+            try:
+                # every command leads its own session, so its process group holds the children too
+                os.killpg(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def alive(self, pids: list[int]) -> set[int]:
+        """PIDs of [pids] which are still running"""
+        # reap exited children first, a zombie would still accept signals
+        self.running()
+        alive = set()
+        for pid in pids:
+            try:
+                os.kill(pid, 0)
+                alive.add(pid)
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                alive.add(pid)
+        return alive
+
+
+def mem_available() -> int:
+    """MemAvailable of the current machine in bytes"""
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def rss(pids: list[int], exec: str | None = None) -> dict[int, int]:
+    """PID -> resident memory in bytes of the PIDs still running, with [exec] in their command line if given"""
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    result = {}
+    for pid in pids:
+        try:
+            if exec is not None:
+                with open(f"/proc/{pid}/cmdline", "rb") as f:
+                    if exec.encode() not in f.read():
+                        continue
+            with open(f"/proc/{pid}/statm", "r") as f:
+                result[pid] = int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            pass
+    return result
+
+
+POOL = LocalPool()
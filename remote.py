@@ -1,80 +1,262 @@
 import paramiko
+import threading
+import atexit
+from dataclasses import dataclass, field
 from tqdm import tqdm
 import argparse
 
+
+class SSHPool:
+    """
+    Keep one long-lived SSH transport per server and open channels on demand
+
+    Connections are created lazily, re-established when the transport is
+    no longer active, and closed together by close_all().
+    """
+
+    def __init__(self, keepalive: int = 30):
+        self.keepalive = keepalive
+        self._clients: dict[str, paramiko.SSHClient] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _server_lock(self, server: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(server, threading.Lock())
+
+    def get(self, server: str) -> paramiko.SSHClient:
+        """Return a connected client for [server], reconnecting if stale"""
+        with self._server_lock(server):
+            ssh = self._clients.get(server)
+            transport = ssh.get_transport() if ssh is not None else None
+            if transport is None or not transport.is_active():
+                if ssh is not None:
+                    ssh.close()
+                ssh = paramiko.SSHClient()
+                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                ssh.connect(hostname=server)
+                ssh.get_transport().set_keepalive(self.keepalive)
+                self._clients[server] = ssh
+            return ssh
+
+    def drop(self, server: str):
+        """Close and forget the connection to [server]"""
+        with self._server_lock(server):
+            ssh = self._clients.pop(server, None)
+            if ssh is not None:
+                ssh.close()
+
+    def exec(self, server: str, cmd: str, wait: bool = True) -> str:
+        """
+        Run [cmd] on [server] in a new channel
+
+        Args:
+            server: Server name or IP address
+            cmd: Shell command to run
+            wait: Read the command output, otherwise close the channel right after launching
+
+        Returns:
+            stdout of the command, empty if not waiting
+        """
+        for attempt in range(2):
+            ssh = self.get(server)
+            try:
+                _, stdout, _ = ssh.exec_command(cmd)
+                if not wait:
+                    stdout.channel.close()
+                    return ""
+                return stdout.read().decode()
+            except (paramiko.SSHException, EOFError, OSError):
+                # the transport went stale between the check and the call
+                self.drop(server)
+                if attempt > 0:
+                    raise
+        return ""
+
+    def close_all(self):
+        """Close every pooled connection"""
+        with self._lock:
+            servers = list(self._clients)
+        for server in servers:
+            self.drop(server)
+
+
+POOL = SSHPool()
+atexit.register(POOL.close_all)
+
+
+@dataclass
+class ServerStatus:
+    """
+    Class to hold the load of a server as seen by one probe
+    """
+    server: str
+    # processes of the user running the executable, ours included
+    running: int
+    load: float
+    cores: int
+    # MemAvailable of /proc/meminfo in bytes
+    mem_available: int = 0
+    # probed PIDs which still run the executable for the user
+    alive: set[int] = field(default_factory=set)
+    # PID -> resident memory in bytes, for the PIDs still running
+    rss: dict[int, int] = field(default_factory=dict)
+
+
+def probe_server(server: str, exec: str, pids: list[int] | None = None) -> ServerStatus | None:
+    """
+    Probe running jobs, load, cores, free memory and the liveness and memory of [pids] of [server] in a single round-trip
+
+    A PID counts as alive only while it belongs to the user and its command
+    line holds [exec], so a PID of an earlier run reused by another process
+    does not hold a slot.
+
+    Args:
+        server: Server name or IP address
+        exec: Executable name counted as running jobs
+        pids: PIDs of the jobs launched on [server]
+
+    Returns:
+        ServerStatus, or None if the server can not be reached
+    """
+    cmd = (f"pgrep -c -f {exec} -u $(whoami); cat /proc/loadavg; nproc; "
+           "awk '/^MemAvailable:/ {print $2}' /proc/meminfo")
+    if pids:
+        cmd += "; ps -u $(whoami) -o pid=,rss=,args="
+    try:
+        output = POOL.exec(server, cmd + "; true").split("\n")
+        rss = {}
+        for line in output[4:]:
+            fields = line.split(None, 2)
+            if len(fields) == 3 and int(fields[0]) in pids and exec in fields[2]:
+                rss[int(fields[0])] = int(fields[1]) * 1024
+        alive = set(rss)
+        return ServerStatus(
+            server=server,
+            # other campaigns of the user count against max_proc_per_server as well
+            running=max(int(output[0].strip()), len(alive)),
+            load=float(output[1].split()[0]),
+            cores=int(output[2].strip()),
+            mem_available=int(output[3].strip() or 0) * 1024,
+            alive=alive,
+            rss=rss,
+        )
+    except Exception as e:
+        tqdm.write(f"Connect to {server} failed, error: {e}")
+        return None
+
+
+def launch_batch(server: str, cmds: list[str]) -> list[int]:
+    """
+    Launch many background commands on [server] in one remote shell
+
+    Every command runs detached in its own subshell, so a command ending
+    with `exec <binary>` reports the PID of the binary itself.
+
+    Args:
+        server: Server name or IP address
+        cmds: Shell commands to launch, without a trailing `&`
+
+    Returns:
+        PIDs of the launched commands in the order of [cmds]. If the connection
+        breaks, the PIDs echoed so far, so the commands which started are not
+        launched again.
+    """
+    if not cmds:
+        return []
+    script = "\n".join(
+        f"( {cmd} ) </dev/null >/dev/null 2>&1 &\necho $!" for cmd in cmds)
+    pids = []
+    try:
+        # read the PIDs as they are echoed, not through POOL.exec which runs a failed command again
+        _, stdout, _ = POOL.get(server).exec_command(script)
+        for line in stdout:
+            if line.strip():
+                pids.append(int(line))
+    except Exception as e:
+        tqdm.write(f"Connect to {server} failed after launching {len(pids)} of {len(cmds)} jobs, error: {e}")
+        POOL.drop(server)
+    return pids
+
+
+def launch(server: str, cmd: str) -> bool:
+    """
+    Launch a background command on [server] without waiting for it
+
+    Returns:
+        True if the command was handed to the server
+    """
+    try:
+        POOL.exec(server, cmd, wait=False)
+        return True
+    except Exception as e:
+        tqdm.write(f"Connect to {server} failed, error: {e}")
+        return False
+
+
 def check_load_and_run(server: str|None, cmd:str, exec:str, max_run_in_server:int) -> bool:
     if server is None:
         server = "localhost"
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
 
     try:
-        ssh.connect(hostname=server)
         # 执行任务数量
-        _, stdout, _ = ssh.exec_command(f"pgrep -c -f {exec} -u $(whoami)")
-        running_num = int(stdout.read().decode().strip())
+        running_num = int(POOL.exec(server, f"pgrep -c -f {exec} -u $(whoami)").strip())
 
         #检查负载
-        _, stdout, _ = ssh.exec_command("uptime")
-        load = float(stdout.read().decode().strip().split(" ")[-2].split(",")[0])
+        load = float(POOL.exec(server, "uptime").strip().split(" ")[-2].split(",")[0])
 
         # 核心数量
-        _, stdout, _ = ssh.exec_command(f"nproc")
-        cores = int(stdout.read().decode().strip())
+        cores = int(POOL.exec(server, "nproc").strip())
 
         if running_num > max_run_in_server or load >= cores/2:
-            ssh.close()
             return False
 
-        _, stdout, _ = ssh.exec_command(cmd)
-        ssh.close()
+        POOL.exec(server, cmd, wait=False)
         return True
     except Exception as e:
         tqdm.write(f"Connect to {server} failed, error: {e}")
         return False
 
 def kill_all_run(server, exec):
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
     try:
-        ssh.connect(hostname=server)
         # Count the processes before killing them
-        _, stdout, _ = ssh.exec_command(f"pgrep -c -f {exec} -u $(whoami)")
-        totalCount = int(stdout.read().decode().strip())
-        # Kill the processes
-        _, stdout, _ = ssh.exec_command(f"pkill -c -f {exec} -u $(whoami)")
-        # Count the processes after killing them
-        killCount = int(stdout.read().decode().strip())
-        ssh.close()
+        totalCount = int(POOL.exec(server, f"pgrep -c -f {exec} -u $(whoami)").strip())
+        # Kill the processes and count how many were killed
+        killCount = int(POOL.exec(server, f"pkill -c -f {exec} -u $(whoami)").strip())
 
         print(f'On {server}, {killCount} Killed ,{totalCount-killCount} Remain')
     except Exception as e:
         tqdm.write(f"Connect to {server} failed, error: {e}")
 
+def kill_pids(server: str, pids: list[int]) -> bool:
+    """
+    Kill processes of the current user on [server] by PID
+
+    Returns:
+        True if the kill command reached the server
+    """
+    if not pids:
+        return True
+    try:
+        POOL.exec(server, f"kill -9 {' '.join(str(pid) for pid in pids)} 2>/dev/null; true")
+        return True
+    except Exception as e:
+        tqdm.write(f"Connect to {server} failed, error: {e}")
+        return False
+
 def check_process_status(server: str, exec: str) -> None:
     """检查服务器上指定进程的运行状态和系统负载"""
-    ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-
     try:
-        ssh.connect(hostname=server)
-        
         # 检查指定进程数量
-        _, stdout, _ = ssh.exec_command(f"pgrep -c -f {exec} -u $(whoami)")
-        running_processes = int(stdout.read().decode().strip())
+        running_processes = int(POOL.exec(server, f"pgrep -c -f {exec} -u $(whoami)").strip())
         
         # 检查系统负载
-        _, stdout, _ = ssh.exec_command("uptime")
-        uptime_output = stdout.read().decode().strip()
+        uptime_output = POOL.exec(server, "uptime").strip()
         load_avg = uptime_output.split("load average: ")[1].split(", ")
         load_1min, load_5min, load_15min = [float(load) for load in load_avg]
         
         # 检查CPU核心数
-        _, stdout, _ = ssh.exec_command("nproc")
-        cores = int(stdout.read().decode().strip())
-        
-        ssh.close()
+        cores = int(POOL.exec(server, "nproc").strip())
         
         print(f"\n=== Server: {server} ===")
         print(f"Running '{exec}' processes: {running_processes}")
@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+from collections import deque
+from tqdm import tqdm
+
+# Load custom modules
+import checkrun
+import dispatch
+
+# Seconds a launched job may run before its outputs exist, e.g. while its checkpoint is staged
+LAUNCH_GRACE = 60
+
+
+class Retrier:
+    """
+    Act on the failed checkpoints of the issued configurations by error class
+
+    A checkpoint without any output once its process is gone (the launch
+    was lost on the way or the node went down) is transient: it is
+    launched again on another server, at most [max_retries] times. A
+    deterministic error (a rejected option or script error) fails its whole
+    configuration: its running checkpoints are killed and marked cancelled,
+    and its checkpoints not issued yet are dropped by the dispatcher.
+    Crashes of the simulation itself are left as errors, a rerun of the
+    same checkpoint fails the same way.
+
+    Jobs are registered and polled from the issuing threads while the
+    monitor polls, every entry point holds the same lock.
+    """
+
+    def __init__(self, server_list: list[str], exec: str, max_proc_per_server: int,
+                 max_retries: int):
+        self.max_retries = max_retries
+        self.dispatcher = dispatch.Dispatcher(server_list, exec, max_proc_per_server)
+        # output directory -> launched job
+        self.jobs: dict[str, dispatch.Job] = {}
+        # output directory -> monotonic time of its last launch
+        self.launched_at: dict[str, float] = {}
+        # output directory -> number of relaunches
+        self.retries: dict[str, int] = {}
+        # lost jobs waiting for a slot on another server
+        self.pending: deque[dispatch.Job] = deque()
+        # output directory -> PID found dead
+        self.dead: dict[str, int] = {}
+        # configuration -> first deterministic error
+        self.failed: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def register(self, jobs: list[dispatch.Job]):
+        """Record launched jobs so their failures can be acted on"""
+        now = time.monotonic()
+        with self._lock:
+            for job in jobs:
+                self.jobs[job.output_dir] = job
+                self.launched_at[job.output_dir] = now
+
+    def _check_alive(self, cpt_dirs: list[str]):
+        jobs = [self.jobs[cpt_dir] for cpt_dir in cpt_dirs]
+        alive = self.dispatcher.alive(jobs)
+        for cpt_dir, job in zip(cpt_dirs, jobs):
+            if (job.server, job.pid) not in alive:
+                self.dead[cpt_dir] = job.pid
+
+    def _fail(self, config_name: str, reason: str, states: dict[str, str]):
+        """Kill and mark cancelled the unfinished checkpoints of a failed configuration"""
+        self.failed[config_name] = reason
+        unfinished = {
+            checkrun.cpt_dir_of(leaf): leaf for leaf, state in states.items()
+            if state not in checkrun.TERMINAL_STATES
+            and checkrun.cpt_dir_of(leaf) in self.jobs
+        }
+        self.dispatcher.kill([self.jobs[cpt_dir] for cpt_dir in unfinished])
+        self.pending = deque(job for job in self.pending if job.arch_name != config_name)
+        for cpt_dir, leaf in unfinished.items():
+            with open(os.path.join(leaf, "simerr"), "a") as f:
+                f.write(f"\n{checkrun.CANCELLED_MARKER}: {reason}\n")
+        for cpt_dir in [d for d, job in self.jobs.items() if job.arch_name == config_name]:
+            del self.jobs[cpt_dir]
+        tqdm.write(f"! Failed: {config_name} ({reason}), cancelled {len(unfinished)} checkpoints")
+
+    def poll(self, config_name: str, checker: checkrun.RunChecker) -> set[str]:
+        """
+        Relaunch lost checkpoints and fail the configuration on a deterministic error.
+
+        Args:
+            config_name: Configuration name
+            checker: Checker of the configuration, right after a check()
+
+        Returns:
+            Missing leaves which are still starting or waiting to be relaunched,
+            they count as running instead of as errors
+        """
+        with self._lock:
+            return self._poll(config_name, checker)
+
+    def _poll(self, config_name: str, checker: checkrun.RunChecker) -> set[str]:
+        if config_name in self.failed:
+            return set()
+
+        now = time.monotonic()
+        waiting = {job.output_dir for job in self.pending}
+        starting = set()
+        lost = {}
+        for leaf, state in checker.states.items():
+            cpt_dir = checkrun.cpt_dir_of(leaf)
+            if cpt_dir not in self.jobs:
+                continue
+            if state == checkrun.ERROR:
+                kind, message = checkrun.error_class(leaf)
+                if kind == checkrun.DETERMINISTIC:
+                    self._fail(config_name, message, checker.states)
+                    return set()
+            elif state == checkrun.MISSING:
+                if cpt_dir in waiting or now - self.launched_at[cpt_dir] < LAUNCH_GRACE:
+                    starting.add(leaf)
+                else:
+                    lost[cpt_dir] = leaf
+
+        if lost:
+            self._check_alive(list(lost))
+        for cpt_dir, leaf in lost.items():
+            job = self.jobs[cpt_dir]
+            if self.dead.get(cpt_dir) != job.pid:
+                # still alive, e.g. copying its checkpoint
+                starting.add(leaf)
+                continue
+            if self.retries.get(cpt_dir, 0) >= self.max_retries:
+                tqdm.write(f"! Gave up {cpt_dir}: no output after {self.max_retries} retries")
+                del self.jobs[cpt_dir]
+                continue
+            self.retries[cpt_dir] = self.retries.get(cpt_dir, 0) + 1
+            tqdm.write(f"Lost on {job.server} without output, requeue "
+                       f"{self.retries[cpt_dir]}/{self.max_retries}: {cpt_dir}")
+            self.pending.append(job)
+            starting.add(leaf)
+
+        if self.pending:
+            for job in self.dispatcher.relaunch(self.pending):
+                self.launched_at[job.output_dir] = time.monotonic()
+        return starting
+
+    def close(self):
+        self.dispatcher.close()
@@ -1,37 +1,50 @@
 import os
 import re
 import time
+import threading
 import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import timedelta
 from tqdm import tqdm
+import numpy as np
 
 # Load custom modules
-import remote
 import checkrun
+import admission
 import config
-
-
-def run_cmd(env: config.EnvironmentConfig,
-            run: config.RunningConfig,
-            workload: config.WorkloadConfig,
-            arch: config.ArchParamConfig,
-            server_list: list[str]):
+import cptcost
+import cptindex
+import dispatch
+import ledger
+import retry
+import scorer
+import speculate
+import staging
+import watchdog
+import watcher
+
+
+def build_jobs(env: config.EnvironmentConfig,
+               run: config.RunningConfig,
+               workload: config.WorkloadConfig,
+               arch: config.ArchParamConfig) -> list[dispatch.Job]:
     """
-    Run gem5 simulation in [server_list] for specified checkpoints with given configuration
+    Build the gem5 jobs of [workload] for specified checkpoints with given configuration
 
     Args:
         env: Configuration parameters for environment
         run: Configuration parameters for execution
         workload: Configuration parameters for workload
         arch: Configuration parameters for arch and script
-        server_list: List of server names or IP addresses
+
+    Returns:
+        List of jobs to dispatch, without checkpoints already complete when resuming
     """
 
     restorer = env.restorer
     ref_so = env.ref_so
 
     gem5_bin = run.gem5_bin
-    max_proc_per_server = run.max_proc_per_server
     output_base_dir = run.output_base_dir
     resume = run.resume
 
@@ -42,7 +55,11 @@ def run_cmd(env: config.EnvironmentConfig,
     workload_name = workload.workload_name
     cpt_path_list = workload.cpt_path_list
 
-    for cpt in tqdm(cpt_path_list, desc=f"Issuing {workload_name}", leave=False, unit="checkpoint", dynamic_ncols=True):
+    # states recorded by the job ledger, checkpoints it does not know or never saw ending are checked on disk
+    recorded = ledger.LEDGER.states(arch_name) if resume and ledger.LEDGER is not None else {}
+
+    jobs = []
+    for cpt in cpt_path_list:
         # Extract identification information from checkpoint path
         matchs = re.findall(r'(\d+)_([0-9]*\.?[0-9]+)', os.path.basename(cpt))
         inst_num, weight = matchs[0]
@@ -54,7 +71,9 @@ def run_cmd(env: config.EnvironmentConfig,
         os.makedirs(cpt_output_dir, exist_ok=True)
 
         # Skip if output directory exists and simulation is complete
-        if resume and checkrun.check_run(cpt_output_dir)[0] == 1:
+        state = recorded.get(cpt_output_dir, ledger.RUNNING)
+        if resume and (state == ledger.COMPLETE or
+                       state == ledger.RUNNING and checkrun.check_run(cpt_output_dir)[0] == 1):
             # tqdm.write(
             #     f"Skip {cpt_output_dir} because reached max instruction count or m5_exit")
             continue
@@ -73,14 +92,23 @@ def run_cmd(env: config.EnvironmentConfig,
             f"cd {cpt_output_dir}"
         ]
 
-        # Gem5 binary and output redirection
+        # Restore from a server-local copy of the checkpoint when staging is enabled
+        if run.stage_dir is not None:
+            dir_setup += staging.stage_cmds(
+                cpt, run.stage_dir, int(run.stage_limit_gb * 1024**3))
+            cpt_arg = f"${staging.CPT_VAR}"
+        else:
+            cpt_arg = cpt
+
+        # Gem5 binary and output redirection, exec so the launch reports the gem5 PID
         gem5_cmd = [
+            "exec",
             gem5_bin,
             "--redirect-stdout",
             "--redirect-stderr",
             script_path,
-            f"--generic-rv-cpt={cpt}",
-        ] + script_params + ["&"]
+            f"--generic-rv-cpt={cpt_arg}",
+        ] + script_params
 
         gem5_cmd = " ".join(gem5_cmd)
 
@@ -88,24 +116,167 @@ def run_cmd(env: config.EnvironmentConfig,
         cmd_parts = env_setup + dir_setup + [gem5_cmd]
         cmd = "; ".join(cmd_parts)
 
-        # Try to distribute the job until successful
-        distribute_ok = False
-        # tqdm.write(cmd)
-        # exit()
-        while not distribute_ok:
-            for server in server_list:
-
-                time.sleep(2)
-                distribute_ok = remote.check_load_and_run(
-                    server, cmd,
-                    os.path.basename(gem5_bin),
-                    max_proc_per_server
-                )
-                
-                if distribute_ok:
-                    tqdm.write(
-                        f"Distribute to {server} with cpt dir: {cpt_output_dir}")
-                    break
+        jobs.append(dispatch.Job(
+            arch_name=arch_name,
+            workload_name=workload_name,
+            cpt=cpt,
+            output_dir=cpt_output_dir,
+            cmd=cmd,
+        ))
+
+    return jobs
+
+
+# (workload, inst) -> seconds, runtimes read from earlier runs or completed since
+RUNTIMES: dict[tuple[str, str], float] = {}
+
+# (workload, inst) looked up in runtime_history without a runtime, not scanned for again
+UNKNOWN_RUNTIMES: set[tuple[str, str]] = set()
+
+# Duplicates stragglers of the issued configurations when running.speculate is set
+SPECULATOR: speculate.Speculator | None = None
+
+# Relaunches lost checkpoints and fails configurations with deterministic errors
+RETRIER: retry.Retrier | None = None
+
+# Kills and requeues hung checkpoints of the issued configurations when running.stall_timeout is set
+WATCHDOG: watchdog.Watchdog | None = None
+
+# Held while creating the services above, issue_archs runs on the issuing threads of a batch
+_SERVICES_LOCK = threading.Lock()
+
+
+def job_key(job: dispatch.Job) -> tuple[str, str]:
+    """(workload, inst) of a job, as in its output directory name"""
+    match = cptindex.CPT_DIR_RE.match(os.path.basename(job.output_dir))
+    return match.group(1), match.group(2)
+
+
+def expected_runtimes(jobs: list[dispatch.Job], run: config.RunningConfig) -> list[float]:
+    """
+    Expected runtime of every job.
+
+    Taken from earlier runs of the same checkpoint, else the median of the
+    known checkpoints of the workload, else the runtime_prior of the
+    workload, else the median of all known checkpoints. The history is
+    scanned once per checkpoint, checkpoints completing later are added by
+    learn_runtimes.
+
+    Args:
+        jobs: Jobs to estimate
+        run: Running configuration holding runtime_history and runtime_prior
+
+    Returns:
+        Seconds per job, in the order of [jobs]
+    """
+    keys = [job_key(job) for job in jobs]
+    missing = {key for key in keys if key not in RUNTIMES and key not in UNKNOWN_RUNTIMES}
+    if missing:
+        found = cptcost.collect_runtimes(run.runtime_history, missing)
+        RUNTIMES.update(found)
+        UNKNOWN_RUNTIMES.update(missing - found.keys())
+
+    known: dict[str, list[float]] = {}
+    for workload, inst in keys:
+        if (workload, inst) in RUNTIMES:
+            known.setdefault(workload, []).append(RUNTIMES[(workload, inst)])
+    all_known = [t for times in known.values() for t in times]
+    fallback = float(np.median(all_known)) if all_known else 0.0
+
+    runtimes = []
+    for workload, inst in keys:
+        if (workload, inst) in RUNTIMES:
+            runtimes.append(RUNTIMES[(workload, inst)])
+        elif workload in known:
+            runtimes.append(float(np.median(known[workload])))
+        else:
+            runtimes.append(float(run.runtime_prior.get(workload, fallback)))
+    return runtimes
+
+
+def learn_runtimes(leaves: list[str]):
+    """Record the runtime of newly completed checkpoints for the next schedules"""
+    for leaf in leaves:
+        cpt_dir = checkrun.cpt_dir_of(leaf)
+        match = cptindex.CPT_DIR_RE.match(os.path.basename(cpt_dir))
+        seconds = cptcost.host_seconds(cpt_dir) if match is not None else None
+        if seconds is not None:
+            RUNTIMES[(match.group(1), match.group(2))] = seconds
+
+
+def schedule_jobs(jobs: list[dispatch.Job], run: config.RunningConfig) -> list[dispatch.Job]:
+    """
+    Order the job queue according to run.schedule.
+
+    "lpt" starts the longest expected jobs first so that slow checkpoints
+    do not stretch the makespan, "fifo" keeps the order of the workload list.
+    Jobs with the same expected runtime keep their order.
+    """
+    if run.schedule != "lpt" or len(jobs) < 2:
+        return jobs
+    runtimes = expected_runtimes(jobs, run)
+    order = sorted(range(len(jobs)), key=lambda i: runtimes[i], reverse=True)
+    return [jobs[i] for i in order]
+
+
+def open_ledger(run: config.RunningConfig):
+    """
+    Open the job ledger of [run], its unfinished jobs count as running on their servers.
+
+    Also sets the admission limits of [run], the ledger holds the memory they learn from.
+    """
+    admission.configure(run)
+    if run.ledger is None or (ledger.LEDGER is not None and ledger.LEDGER.path == run.ledger):
+        return
+    for server, pids in ledger.open_ledger(run.ledger).running_pids().items():
+        dispatch.MONITOR.track_pids(server, pids)
+
+
+def start_services(run: config.RunningConfig, server_list: list[str]):
+    """
+    Create the retrier, and the speculator and watchdog when configured, once per process.
+
+    Called before the issuing threads of a batch start, issue_archs calls it
+    again for single runs.
+    """
+    global SPECULATOR, WATCHDOG, RETRIER
+
+    exec = os.path.basename(run.gem5_bin)
+    with _SERVICES_LOCK:
+        if RETRIER is None:
+            RETRIER = retry.Retrier(server_list, exec, run.max_proc_per_server, run.max_retries)
+        if run.speculate is not None and SPECULATOR is None:
+            SPECULATOR = speculate.Speculator(
+                server_list, exec, run.max_proc_per_server, run.speculate, run.output_base_dir)
+        if run.stall_timeout is not None and WATCHDOG is None:
+            WATCHDOG = watchdog.Watchdog(
+                server_list, exec, run.max_proc_per_server, run.stall_timeout, run.max_retries)
+
+
+def run_cmd(env: config.EnvironmentConfig,
+            run: config.RunningConfig,
+            workload: config.WorkloadConfig,
+            arch: config.ArchParamConfig,
+            server_list: list[str]):
+    """
+    Run gem5 simulation in [server_list] for specified checkpoints with given configuration
+
+    Args:
+        env: Configuration parameters for environment
+        run: Configuration parameters for execution
+        workload: Configuration parameters for workload
+        arch: Configuration parameters for arch and script
+        server_list: List of server names or IP addresses
+    """
+    open_ledger(run)
+    dispatcher = dispatch.Dispatcher(
+        server_list, os.path.basename(run.gem5_bin), run.max_proc_per_server)
+    try:
+        dispatcher.dispatch(
+            schedule_jobs(build_jobs(env=env, run=run, workload=workload, arch=arch), run),
+            desc=f"Issuing {workload.workload_name}")
+    finally:
+        dispatcher.close()
 
 
 def issue_archs(env: config.EnvironmentConfig,
@@ -127,32 +298,157 @@ def issue_archs(env: config.EnvironmentConfig,
         List of successfully issued arch config names
     """
 
+    open_ledger(run)
+    start_services(run, server_list)
     issued_configs = []
+    dispatcher = dispatch.Dispatcher(
+        server_list, os.path.basename(run.gem5_bin), run.max_proc_per_server)
 
-    for arch in tqdm(arch_list, desc="Issuing configurations", unit="config", dynamic_ncols=True):
+    # Collect the jobs of every workload of every arch, so the schedule spans all of them
+    start_time = time.time()
+    jobs = []
+    for arch in arch_list:
         try:
-            start_time = time.time()
-            # Process each workload for the current configuration
-            for workload in tqdm(workload_list, desc=f"Issuing {arch.arch_name}", leave=False, unit="workload", dynamic_ncols=True):
-                run_cmd(env=env, run=run,
-                        workload=workload,
-                        arch=arch,
-                        server_list=server_list)
-
-            # Report completion time
-            elapsed = time.time() - start_time
-            elapsed_str = str(timedelta(seconds=int(elapsed)))
-            tqdm.write(
-                f"✓ Configuration {arch.arch_name} issued in {elapsed_str}")
+            for workload in workload_list:
+                jobs += build_jobs(env=env, run=run,
+                                   workload=workload,
+                                   arch=arch)
             issued_configs.append(arch.arch_name)
-
         except Exception as e:
             tqdm.write(f"! Error Issuing {arch.arch_name}: {e}")
 
+    jobs = [job for job in jobs if job.arch_name in issued_configs]
+
+    # configuration -> checker used while issuing, apart from the monitor's
+    checkers: dict[str, checkrun.RunChecker] = {}
+
+    def cancel(placed: list[dispatch.Job]) -> set[str]:
+        # hung jobs are killed even while every slot is taken, so issuing can go on
+        RETRIER.register(placed)
+        if WATCHDOG is not None:
+            WATCHDOG.register(placed)
+        for job in placed:
+            if job.arch_name not in checkers:
+                checkers[job.arch_name] = checkrun.RunChecker(os.path.join(run.output_base_dir, job.arch_name))
+        for arch_name, checker in checkers.items():
+            checker.check()
+            starting = RETRIER.poll(arch_name, checker)
+            if WATCHDOG is not None and WATCHDOG.poll(arch_name, checker):
+                checker.check()
+            if ledger.LEDGER is not None:
+                record_ended(arch_name, checker, starting)
+        # fail fast: stop issuing a configuration once one of its checkpoints failed deterministically
+        return {arch_name for arch_name in checkers if arch_name in RETRIER.failed}
+
+    try:
+        launched = dispatcher.dispatch(schedule_jobs(jobs, run), desc="Issuing configurations", cancel=cancel)
+        if SPECULATOR is not None:
+            SPECULATOR.register(launched)
+    except Exception as e:
+        tqdm.write(f"! Error Issuing {', '.join(issued_configs)}: {e}")
+        issued_configs = []
+    finally:
+        dispatcher.close()
+
+    # Report completion time
+    elapsed_str = str(timedelta(seconds=int(time.time() - start_time)))
+    for arch_name in issued_configs:
+        tqdm.write(f"✓ Configuration {arch_name} issued in {elapsed_str}")
     return issued_configs
 
 
-def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int = 10):
+def peak_memory(cpt_dir: str, server: str, pid: int) -> int | None:
+    """Peak memory of an ended job in bytes, the larger of the probe samples and the peak gem5 reported"""
+    samples = [dispatch.MONITOR.peak_rss(server, pid), admission.host_memory(cpt_dir)]
+    return max((sample for sample in samples if sample is not None), default=None)
+
+
+def record_ended(config_name: str, checker: checkrun.RunChecker, starting: set[str]):
+    """Record in the job ledger the jobs of a configuration seen ending by the last check"""
+    running = ledger.LEDGER.running(config_name)
+    if not running:
+        return
+    results = []
+    for leaf, state in checker.states.items():
+        cpt_dir = checkrun.cpt_dir_of(leaf)
+        if cpt_dir not in running:
+            continue
+        if state == checkrun.COMPLETE:
+            results.append((cpt_dir, ledger.COMPLETE, None, peak_memory(cpt_dir, *running[cpt_dir])))
+        elif state == checkrun.ERROR or (state == checkrun.MISSING and leaf not in starting):
+            results.append((cpt_dir, ledger.ERROR, checkrun.error_class(leaf)[1] or None,
+                            peak_memory(cpt_dir, *running[cpt_dir])))
+    if results:
+        ledger.LEDGER.ended(results)
+
+
+def check_config(config_name: str, base_dir: str,
+                 accumulator: scorer.StreamingScore | None = None) -> tuple[int, int, int, list[str]]:
+    """
+    Check a configuration once and feed newly completed checkpoints to [accumulator].
+
+    Returns:
+        Same as checkrun.check_run
+    """
+    checker = checkrun.get_checker(os.path.join(base_dir, config_name))
+    status = checker.check()
+    changed = False
+    starting = set()
+    if RETRIER is not None:
+        failed = config_name in RETRIER.failed
+        starting = RETRIER.poll(config_name, checker)
+        changed |= not failed and config_name in RETRIER.failed
+    if WATCHDOG is not None:
+        changed |= WATCHDOG.poll(config_name, checker)
+    # a speculative copy which finished first replaces its straggler
+    if SPECULATOR is not None:
+        changed |= SPECULATOR.poll(config_name, checker)
+    # check again to count the given up, cancelled and replaced checkpoints
+    if changed:
+        newly_complete = checker.newly_complete
+        status = checker.check()
+        checker.newly_complete = newly_complete + checker.newly_complete
+    # checkpoints still starting or waiting for a relaunch are not errors yet
+    if starting:
+        complete, _, total, error_list = status
+        error_list = [leaf for leaf in error_list if leaf not in starting]
+        status = (complete, len(error_list), total, error_list)
+    if ledger.LEDGER is not None:
+        record_ended(config_name, checker, starting)
+    learn_runtimes(checker.newly_complete)
+    if accumulator is not None:
+        for leaf in checker.newly_complete:
+            accumulator.ingest(leaf)
+        accumulator.retry_pending()
+    return status
+
+
+def config_failure(config_name: str) -> str | None:
+    """Deterministic error which failed a configuration, None if it did not fail"""
+    if RETRIER is None:
+        return None
+    return RETRIER.failed.get(config_name)
+
+
+def is_config_finished(config_name: str, base_dir: str,
+                       accumulator: scorer.StreamingScore | None = None) -> bool:
+    """
+    Check once, without blocking, whether every checkpoint of a configuration has ended.
+
+    Args:
+        config_name: Configuration name
+        base_dir: Base directory where outputs are stored
+        accumulator: Streaming score fed with newly completed checkpoints
+
+    Returns:
+        True if all checkpoints are complete or errored
+    """
+    complete, error, total, _ = check_config(config_name, base_dir, accumulator)
+    return (complete + error) == total
+
+
+def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int = 10, watch: bool = False,
+                         accumulators: dict[str, scorer.StreamingScore] | None = None):
     """
     Monitor the progress of all running configurations until completion.
 
@@ -160,6 +456,8 @@ def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int
         configs: List of configurations to monitor
         base_dir: Base directory where outputs are stored
         check_interval: Time between progress checks in seconds
+        watch: Also wake up on simout/simerr close-write events (inotify)
+        accumulators: Streaming scores of some configurations, fed as checkpoints complete
 
     Returns:
         List of completed configurations
@@ -168,9 +466,11 @@ def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int
     progress_trackers = {}
     finish_configs = set()
 
+    accumulators = accumulators or {}
+
     for config_name in configs:
-        complete, error, total, _ = checkrun.check_run(
-            os.path.join(base_dir, config_name))
+        complete, error, total, _ = check_config(
+            config_name, base_dir, accumulators.get(config_name))
         progress_trackers[config_name] = {
             "tracker": tqdm(
                 total=total,
@@ -184,12 +484,15 @@ def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int
             "total": total
         }
 
+    completion_watcher = watcher.CompletionWatcher(
+        [os.path.join(base_dir, config_name) for config_name in configs]) if watch else None
+
     # Monitor progress until all configurations are complete
     while finish_configs != set(configs):
         for config_name in set(configs) - finish_configs:
             # Get updated status
-            new_complete, new_error, new_total, _ = checkrun.check_run(
-                os.path.join(base_dir, config_name))
+            new_complete, new_error, new_total, _ = check_config(
+                config_name, base_dir, accumulators.get(config_name))
 
             # Update progress bar
             progress = progress_trackers[config_name]
@@ -198,6 +501,11 @@ def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int
             # if finished_tasks > 0:
             #     progress["tracker"].update(finished_tasks)
             progress["tracker"].n = new_complete + new_error
+            if config_name in accumulators:
+                # partial score of the checkpoints completed so far
+                partial = accumulators[config_name].result().int_score
+                if partial is not None:
+                    progress["tracker"].set_postfix(score=f"{partial:.3f}", refresh=False)
             progress["tracker"].refresh()
 
             # Update stored values
@@ -212,7 +520,13 @@ def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int
                     f"✓ Finish: {config_name} | Success: {new_complete}/{new_total} | Errors: {new_error}/{new_total}")
 
         if finish_configs != set(configs):
-            time.sleep(check_interval)
+            if completion_watcher is not None:
+                completion_watcher.wait(check_interval)
+            else:
+                time.sleep(check_interval)
+
+    if completion_watcher is not None:
+        completion_watcher.close()
 
     # Close progress bars
     for progress in progress_trackers.values():
@@ -221,38 +535,81 @@ def monitor_run_progress(configs: list[str], base_dir: str, check_interval: int
     return list(finish_configs)
 
 
-def calculate_performance_scores(finish_configs: list[str], base_dir: str, env: config.EnvironmentConfig):
+def score_one_config(config_name: str, base_dir: str, env: config.EnvironmentConfig,
+                     scorer_name: str = "native") -> str:
+    """
+    Calculate the performance score of one completed configuration.
+
+    Args:
+        config_name: Completed configuration name
+        base_dir: Base result directory where configurations are stored
+        env: Environment configuration
+        scorer_name: "native" to score in-process with scorer.py,
+                     "gem5_data_proc" to run gem5-score-ci.sh of gem5_data_proc
+
+    Returns:
+        Path to the generated score file
+    """
+    config_path = os.path.join(base_dir, config_name)
+    score_file = f"{config_path}.score.txt"
+
+    if scorer_name == "native":
+        scorer.write_score(scorer.score_config(config_path, env), score_file)
+        return score_file
+
+    version = "-17" if env.workload_version == "spec2017" else ""
+
+    # Prepare score calculation command
+    score_cmd = [
+        f"export PYTHONPATH={env.gem5_data_proc_home}:$PYTHONPATH",
+        f"cd {env.gem5_data_proc_home}",
+        f"bash example-scripts/gem5-score-ci{version}.sh {config_path} {env.workload_root}/cluster-0-0.json > {score_file}"
+    ]
+
+    # Execute score calculation
+    os.system(" && ".join(score_cmd))
+    return score_file
+
+
+def calculate_performance_scores(finish_configs: list[str], base_dir: str, env: config.EnvironmentConfig,
+                                 scorer_name: str = "native", workers: int | None = None):
     """
     Calculate performance scores for completed configurations.
 
+    Configurations are scored in a process pool, each score file is
+    written as soon as its configuration is scored.
+
     Args:
         finish_configs: List of completed configuration names
         base_dir: Base result directory where configurations are stored
+        env: Environment configuration
+        scorer_name: "native" or "gem5_data_proc", see score_one_config
+        workers: Size of the process pool, defaults to the number of cores
 
     Returns:
-        List of paths to generated score files
+        List of paths to generated score files, in the order of [finish_configs]
     """
-    
-    score_files = []
-
-    for config_name in finish_configs:
-        # Calculate performance score for completed configuration
-        config_path = os.path.join(base_dir, config_name)
-        score_file = f"{config_path}.score.txt"
-        version = "-17" if env.workload_version == "spec2017" else ""
-
-        # Prepare score calculation command
-        score_cmd = [
-            f"export PYTHONPATH={env.gem5_data_proc_home}:$PYTHONPATH",
-            f"cd {env.gem5_data_proc_home}",
-            f"bash example-scripts/gem5-score-ci{version}.sh {config_path} {env.workload_root}/cluster-0-0.json > {score_file}"
-        ]
-
-        # Execute score calculation
-        os.system(" && ".join(score_cmd))
-        score_files.append(score_file)
+    workers = min(workers or os.cpu_count() or 1, len(finish_configs))
+    if workers <= 1:
+        return [score_one_config(config_name, base_dir, env, scorer_name)
+                for config_name in finish_configs]
+
+    score_files = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(score_one_config, config_name, base_dir, env, scorer_name): config_name
+            for config_name in finish_configs
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Scoring", unit="config", dynamic_ncols=True):
+            config_name = futures[future]
+            try:
+                score_files[config_name] = future.result()
+                tqdm.write(f"✓ Scored: {config_name}")
+            except Exception as e:
+                tqdm.write(f"! Error Scoring {config_name}: {e}")
+                score_files[config_name] = os.path.join(base_dir, f"{config_name}.score.txt")
 
-    return score_files
+    return [score_files[config_name] for config_name in finish_configs]
 
 
 if __name__ == "__main__":
@@ -274,10 +631,12 @@ if __name__ == "__main__":
 
     # # Start monitoring and get completed configurations
     finished_arch = monitor_run_progress(
-        issued_arch, run.output_base_dir, 10)
+        issued_arch, run.output_base_dir, 10, watch=run.watch)
 
     # Calculate performance scores for completed configurations
     score_files = calculate_performance_scores(
         finished_arch,
         run.output_base_dir,
-        env)
+        env,
+        run.scorer,
+        run.score_workers)
@@ -0,0 +1,415 @@
+import os
+import re
+import json
+import time
+import argparse
+import numpy as np
+from dataclasses import dataclass, field
+
+# Load custom modules
+import config
+import cptindex
+
+# SPEC reference run times in seconds, keyed by benchmark name
+SPEC06_INT_REF = {
+    "perlbench": 9770, "bzip2": 9650, "gcc": 8050, "mcf": 9120,
+    "gobmk": 10490, "hmmer": 9330, "sjeng": 12100, "libquantum": 20720,
+    "h264ref": 22130, "omnetpp": 6250, "astar": 7020, "xalancbmk": 6900,
+}
+
+SPEC06_FP_REF = {
+    "bwaves": 13590, "gamess": 19580, "milc": 9180, "zeusmp": 10550,
+    "gromacs": 7140, "cactusADM": 11950, "leslie3d": 9400, "namd": 8020,
+    "dealII": 11440, "soplex": 8340, "povray": 5320, "calculix": 8250,
+    "GemsFDTD": 10610, "tonto": 9840, "lbm": 13740, "wrf": 11170,
+    "sphinx3": 19490,
+}
+
+SPEC17_INT_REF = {
+    "perlbench": 1592, "gcc": 1416, "mcf": 1616, "omnetpp": 1312,
+    "xalancbmk": 1056, "x264": 1751, "deepsjeng": 1145, "leela": 1655,
+    "exchange2": 2619, "xz": 1076,
+}
+
+SPEC17_FP_REF = {
+    "bwaves": 1003, "cactuBSSN": 1266, "namd": 950, "parest": 2616,
+    "povray": 2335, "lbm": 1054, "wrf": 2241, "blender": 1521,
+    "cam4": 1751, "imagick": 2487, "nab": 1683, "fotonik3d": 3897,
+    "roms": 1589,
+}
+
+# Per-cpu IPC/CPI of the last statistics dump
+STATS_RE = re.compile(r'^(?:system\.)?cpu\d*\.(ipc|cpi)\s+(\S+)', re.MULTILINE)
+STATS_BEGIN = "---------- Begin Simulation Statistics ----------"
+STATS_END = "---------- End Simulation Statistics"
+
+# Frequency the estimated run time is normalized to
+FREQ_GHZ = 1.0
+
+
+@dataclass
+class WorkloadScore:
+    """
+    Class to hold the weighted result of one workload
+    """
+    workload_name: str
+    cpi: float
+    coverage: float
+    time: float | None
+
+    @property
+    def ipc(self) -> float:
+        return 1 / self.cpi
+
+
+@dataclass
+class ScoreResult:
+    """
+    Class to hold the score of one configuration
+    """
+    workloads: dict[str, WorkloadScore] = field(default_factory=dict)
+    int_scores: dict[str, float] = field(default_factory=dict)
+    fp_scores: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def unscored(self) -> list[str]:
+        """Workloads without an instruction count, left out of the benchmark scores"""
+        return sorted(name for name, workload in self.workloads.items() if workload.time is None)
+
+    @property
+    def int_score(self) -> float | None:
+        return geomean(self.int_scores.values())
+
+    @property
+    def fp_score(self) -> float | None:
+        return geomean(self.fp_scores.values())
+
+    @property
+    def overall_score(self) -> float | None:
+        return geomean(list(self.int_scores.values()) + list(self.fp_scores.values()))
+
+    def format(self) -> str:
+        """Text report, in the layout of the gem5_data_proc score files"""
+        lines = [f"{'workload':<32}{'coverage':>10}{'cpi':>10}{'ipc':>10}"]
+        for name, workload in sorted(self.workloads.items()):
+            lines.append(
+                f"{name:<32}{workload.coverage:>10.3f}{workload.cpi:>10.3f}{workload.ipc:>10.3f}")
+
+        for title, scores in (("Int", self.int_scores), ("FP", self.fp_scores)):
+            if scores:
+                lines.append(f"================ {title} =================")
+                for name, score in sorted(scores.items()):
+                    lines.append(f"{name:<32}{score:>10.3f}")
+
+        for title, score in (("Int", self.int_score), ("FP", self.fp_score), ("overall", self.overall_score)):
+            if score is not None:
+                lines.append(f"Estimated {title} score per GHz: {score:.4f}")
+        return "\n".join(lines) + "\n"
+
+
+def geomean(values) -> float | None:
+    values = np.fromiter(values, dtype=float)
+    if len(values) == 0:
+        return None
+    return float(np.exp(np.log(values).mean()))
+
+
+def benchmark_of(workload_name: str) -> str:
+    """SPEC benchmark of a workload, e.g. gcc_166 -> gcc, h264ref_sss -> h264ref"""
+    return workload_name.split("_")[0]
+
+
+def reference_times(workload_version: str | None) -> tuple[dict[str, int], dict[str, int]]:
+    if workload_version == "spec2017":
+        return SPEC17_INT_REF, SPEC17_FP_REF
+    return SPEC06_INT_REF, SPEC06_FP_REF
+
+
+def parse_stats(stats_path: str) -> float | None:
+    """
+    CPI of the last statistics dump of a gem5 stats.txt
+
+    Returns:
+        CPI, None if the file holds no finite IPC/CPI or its last dump is incomplete
+    """
+    with open(stats_path, "r", errors="replace") as f:
+        content = f.read()
+    begin = content.rfind(STATS_BEGIN)
+    if begin >= 0:
+        content = content[begin:]
+        # the last dump is still being written
+        if STATS_END not in content:
+            return None
+
+    stats = {name: value for name, value in STATS_RE.findall(content)}
+    try:
+        if "cpi" in stats:
+            cpi = float(stats["cpi"])
+        else:
+            cpi = 1 / float(stats["ipc"])
+    except (KeyError, ValueError, ZeroDivisionError):
+        return None
+    return cpi if np.isfinite(cpi) and cpi > 0 else None
+
+
+def find_stats(cpt_dir: str) -> str | None:
+    """stats.txt of a checkpoint output directory (gem5 writes it into m5out)"""
+    for path in (os.path.join(cpt_dir, "m5out", "stats.txt"), os.path.join(cpt_dir, "stats.txt")):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_insts(cluster_json: str) -> dict[str, int]:
+    """
+    Dynamic instruction count of every workload from the SimPoint cluster description
+
+    The file maps each workload to {"insts": <count>, "points": {...}}.
+
+    Raises:
+        ValueError: If the file is missing, malformed or holds no instruction count
+    """
+    try:
+        with open(cluster_json, "r") as f:
+            desc = json.load(f)
+        insts = {
+            workload: int(float(info["insts"]))
+            for workload, info in desc.items()
+            if isinstance(info, dict) and "insts" in info
+        }
+    except (OSError, ValueError, AttributeError) as e:
+        raise ValueError(f"Can not read instruction counts from {cluster_json}: {e}") from e
+    if not insts:
+        raise ValueError(f"No instruction count in {cluster_json}")
+    return insts
+
+
+def require_insts(result: ScoreResult) -> ScoreResult:
+    """
+    Check that every scored workload had an instruction count.
+
+    Raises:
+        ValueError: If a workload is missing from the cluster description,
+                    its benchmark would silently drop out of the score
+    """
+    if result.unscored:
+        raise ValueError(f"No instruction count in cluster-0-0.json for {', '.join(result.unscored)}")
+    return result
+
+
+def collect_points(config_path: str) -> tuple[list[str], np.ndarray, np.ndarray]:
+    """
+    CPI and SimPoint weight of every finished checkpoint of a configuration
+
+    Returns:
+        Workload name, weight and CPI of each checkpoint with valid stats
+    """
+    names, weights, cpis = [], [], []
+    for entry in sorted(os.listdir(config_path)):
+        match = cptindex.CPT_DIR_RE.match(entry)
+        cpt_dir = os.path.join(config_path, entry)
+        if match is None or not os.path.isdir(cpt_dir):
+            continue
+        stats_path = find_stats(cpt_dir)
+        cpi = parse_stats(stats_path) if stats_path is not None else None
+        if cpi is None:
+            continue
+        names.append(match.group(1))
+        weights.append(float(match.group(3)))
+        cpis.append(cpi)
+    return names, np.array(weights, dtype=float), np.array(cpis, dtype=float)
+
+
+def score_points(names: list[str], weights: np.ndarray, cpis: np.ndarray,
+                 insts: dict[str, int], workload_version: str | None) -> ScoreResult:
+    """
+    Weight checkpoint CPIs into workload CPIs and SPEC scores.
+
+    The CPI of a workload is the weight-normalized mean of its checkpoint
+    CPIs, see score_workloads for the scores.
+
+    Args:
+        names: Workload of each checkpoint
+        weights: SimPoint weight of each checkpoint
+        cpis: CPI of each checkpoint
+        insts: Instruction count of each workload
+        workload_version: "spec2017" for CPU2017 reference times, CPU2006 otherwise
+
+    Returns:
+        ScoreResult with per-workload values and per-benchmark scores
+    """
+    if len(names) == 0:
+        return ScoreResult()
+
+    workloads, index = np.unique(np.array(names), return_inverse=True)
+    coverage = np.bincount(index, weights=weights, minlength=len(workloads))
+    cpi = np.bincount(index, weights=weights * cpis, minlength=len(workloads)) / coverage
+    return score_workloads([str(w) for w in workloads], coverage, cpi, insts, workload_version)
+
+
+def score_workloads(workloads: list[str], coverage: np.ndarray, cpi: np.ndarray,
+                    insts: dict[str, int], workload_version: str | None) -> ScoreResult:
+    """
+    SPEC scores from weighted workload CPIs.
+
+    The run time of a workload at FREQ_GHZ is insts * CPI, the run times of
+    the inputs of a benchmark add up, and the score of a benchmark is its
+    reference time divided by that run time.
+
+    Args:
+        workloads: Workload names
+        coverage: Summed SimPoint weight of the scored checkpoints of each workload
+        cpi: Weighted CPI of each workload
+        insts: Instruction count of each workload
+        workload_version: "spec2017" for CPU2017 reference times, CPU2006 otherwise
+
+    Returns:
+        ScoreResult with per-workload values and per-benchmark scores
+    """
+    result = ScoreResult()
+    workload_insts = np.array([insts.get(w, np.nan) for w in workloads], dtype=float)
+    time = workload_insts * cpi / (FREQ_GHZ * 1e9)
+
+    benchmark_time: dict[str, float] = {}
+    for i, workload in enumerate(workloads):
+        valid = bool(np.isfinite(time[i]))
+        result.workloads[workload] = WorkloadScore(
+            workload_name=workload,
+            cpi=float(cpi[i]),
+            coverage=float(coverage[i]),
+            time=float(time[i]) if valid else None,
+        )
+        if valid:
+            benchmark = benchmark_of(workload)
+            benchmark_time[benchmark] = benchmark_time.get(benchmark, 0.0) + float(time[i])
+
+    int_ref, fp_ref = reference_times(workload_version)
+    for benchmark, seconds in benchmark_time.items():
+        if benchmark in int_ref:
+            result.int_scores[benchmark] = int_ref[benchmark] / seconds
+        elif benchmark in fp_ref:
+            result.fp_scores[benchmark] = fp_ref[benchmark] / seconds
+    return result
+
+
+class StreamingScore:
+    """
+    Score a configuration incrementally while its checkpoints complete
+
+    Every completed checkpoint is parsed once by ingest() and folded into
+    running per-workload weight and weight*CPI sums, so result() is
+    available at any time with the coverage reached so far and is final
+    as soon as the last checkpoint is ingested.
+    """
+
+    def __init__(self, config_path: str, env: config.EnvironmentConfig):
+        self.config_path = config_path
+        self.workload_version = env.workload_version
+        self.insts = load_insts(os.path.join(env.workload_root, "cluster-0-0.json"))
+        # workload -> [summed weight, summed weight * CPI]
+        self._sums: dict[str, list[float]] = {}
+        self._ingested: set[str] = set()
+        # completed checkpoints whose stats.txt is not fully written yet
+        self._pending: set[str] = set()
+
+    @property
+    def ingested(self) -> int:
+        """Number of checkpoints folded into the score"""
+        return len(self._ingested)
+
+    @property
+    def pending(self) -> int:
+        """Number of completed checkpoints waiting for their stats.txt"""
+        return len(self._pending)
+
+    def ingest(self, cpt_dir: str) -> bool:
+        """
+        Fold one completed checkpoint into the score.
+
+        Args:
+            cpt_dir: Checkpoint output directory, or its m5out
+
+        Returns:
+            True if the checkpoint is part of the score
+        """
+        if os.path.basename(cpt_dir) == "m5out":
+            cpt_dir = os.path.dirname(cpt_dir)
+        if cpt_dir in self._ingested:
+            return True
+
+        match = cptindex.CPT_DIR_RE.match(os.path.basename(cpt_dir))
+        if match is None:
+            return False
+
+        stats_path = find_stats(cpt_dir)
+        cpi = parse_stats(stats_path) if stats_path is not None else None
+        if cpi is None:
+            # gem5 dumps the final statistics after printing the exit reason
+            self._pending.add(cpt_dir)
+            return False
+
+        weight = float(match.group(3))
+        sums = self._sums.setdefault(match.group(1), [0.0, 0.0])
+        sums[0] += weight
+        sums[1] += weight * cpi
+        self._ingested.add(cpt_dir)
+        self._pending.discard(cpt_dir)
+        return True
+
+    def retry_pending(self):
+        """Ingest completed checkpoints whose stats.txt was not ready before"""
+        for cpt_dir in list(self._pending):
+            self.ingest(cpt_dir)
+
+    def finalize(self, timeout: float = 30, interval: float = 1) -> ScoreResult:
+        """Wait up to [timeout] seconds for pending stats.txt, then return the score"""
+        deadline = time.time() + timeout
+        self.retry_pending()
+        while self._pending and time.time() < deadline:
+            time.sleep(interval)
+            self.retry_pending()
+        return require_insts(self.result())
+
+    def result(self) -> ScoreResult:
+        """Score of the checkpoints ingested so far"""
+        if not self._sums:
+            return ScoreResult()
+        workloads = sorted(self._sums)
+        coverage = np.array([self._sums[w][0] for w in workloads])
+        cpi = np.array([self._sums[w][1] for w in workloads]) / coverage
+        return score_workloads(workloads, coverage, cpi, self.insts, self.workload_version)
+
+
+def score_config(config_path: str, env: config.EnvironmentConfig) -> ScoreResult:
+    """
+    Score a configuration directly from the stats.txt of its checkpoints.
+
+    Args:
+        config_path: Output directory of the configuration
+        env: Environment configuration, for the workload root and version
+
+    Returns:
+        ScoreResult of the configuration
+
+    Raises:
+        ValueError: If the instruction counts of the workloads can not be read
+    """
+    names, weights, cpis = collect_points(config_path)
+    insts = load_insts(os.path.join(env.workload_root, "cluster-0-0.json"))
+    return require_insts(score_points(names, weights, cpis, insts, env.workload_version))
+
+
+def write_score(result: ScoreResult, score_file: str):
+    with open(score_file, "w") as f:
+        f.write(result.format())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score a gem5 configuration output directory")
+    parser.add_argument("config", type=str, help="Configuration File (yaml)")
+    parser.add_argument("dir", type=str, help="Output directory of one configuration")
+    args = parser.parse_args()
+
+    env, _, _, _, _ = config.load_yaml(args.config)
+    print(score_config(args.dir, env).format(), end="")
@@ -0,0 +1,137 @@
+import os
+import shutil
+import dataclasses
+from collections import deque
+from tqdm import tqdm
+
+# Load custom modules
+import checkrun
+import dispatch
+
+# Directory under output_base_dir holding the speculative copies
+SPECULATIVE_DIR = ".speculative"
+
+
+def copy_state(path: str) -> str:
+    """State of a speculative copy, RUNNING until its outputs exist"""
+    checker = checkrun.RunChecker(path)
+    checker.check()
+    states = set(checker.states.values())
+    for state in (checkrun.COMPLETE, checkrun.ERROR):
+        if state in states:
+            return state
+    return checkrun.RUNNING
+
+
+class Speculator:
+    """
+    Re-launch the stragglers of nearly finished configurations
+
+    Once [threshold] of the checkpoints of a configuration have ended, every
+    checkpoint still running gets one duplicate on another server with a
+    free slot, in a separate directory under output_base_dir/.speculative.
+    Whichever copy ends first wins: the other one is killed through its
+    recorded server and PID, and a winning duplicate is moved over the
+    original output directory, so monitoring and scoring see one result.
+    """
+
+    def __init__(self, server_list: list[str], exec: str, max_proc_per_server: int,
+                 threshold: float, base_dir: str):
+        self.threshold = threshold
+        self.base_dir = base_dir
+        # duplicates are not recorded, the ledger keeps one row per checkpoint
+        self.dispatcher = dispatch.Dispatcher(server_list, exec, max_proc_per_server, record=False)
+        # original output directory -> launched job
+        self.jobs: dict[str, dispatch.Job] = {}
+        # original output directory -> running duplicate
+        self.duplicates: dict[str, dispatch.Job] = {}
+        # original output directories which already had a duplicate
+        self.speculated: set[str] = set()
+
+    def register(self, jobs: list[dispatch.Job]):
+        """Record launched jobs so their stragglers can be duplicated and killed"""
+        for job in jobs:
+            self.jobs[job.output_dir] = job
+            self.speculated.discard(job.output_dir)
+
+    def _resolve(self, orig_dir: str, orig_state: str, checker: checkrun.RunChecker) -> bool:
+        """Settle the race between a checkpoint and its duplicate, True if the duplicate won"""
+        dup = self.duplicates[orig_dir]
+        if orig_state in checkrun.TERMINAL_STATES:
+            self.dispatcher.kill([dup])
+            shutil.rmtree(dup.output_dir, ignore_errors=True)
+            del self.duplicates[orig_dir]
+            return False
+
+        dup_state = copy_state(dup.output_dir)
+        if dup_state == checkrun.ERROR:
+            shutil.rmtree(dup.output_dir, ignore_errors=True)
+            del self.duplicates[orig_dir]
+        elif dup_state == checkrun.COMPLETE:
+            self.dispatcher.kill([self.jobs[orig_dir]])
+            # the killed process may still be exiting, move it away before replacing it
+            straggler_dir = f"{dup.output_dir}.straggler"
+            os.rename(orig_dir, straggler_dir)
+            os.rename(dup.output_dir, orig_dir)
+            shutil.rmtree(straggler_dir, ignore_errors=True)
+            checker.forget(orig_dir)
+            self.jobs[orig_dir] = dataclasses.replace(dup, output_dir=orig_dir)
+            del self.duplicates[orig_dir]
+            tqdm.write(f"Speculative copy on {dup.server} finished first: {orig_dir}")
+            return True
+        return False
+
+    def poll(self, config_name: str, checker: checkrun.RunChecker) -> bool:
+        """
+        Settle finished races and duplicate new stragglers of a configuration.
+
+        Args:
+            config_name: Configuration name
+            checker: Checker of the configuration, right after a check()
+
+        Returns:
+            True if a duplicate replaced an original output directory
+        """
+        states = {checkrun.cpt_dir_of(leaf): state for leaf, state in checker.states.items()}
+
+        replaced = False
+        for orig_dir in [d for d in self.duplicates if d in states]:
+            replaced |= self._resolve(orig_dir, states[orig_dir], checker)
+
+        ended = sum(1 for state in states.values() if state in checkrun.TERMINAL_STATES)
+        if not states or ended / len(states) < self.threshold:
+            return replaced
+
+        stragglers = [
+            orig_dir for orig_dir, state in states.items()
+            if state == checkrun.RUNNING and orig_dir in self.jobs
+            and orig_dir not in self.speculated
+        ]
+        if not stragglers:
+            return replaced
+
+        queue = deque()
+        # duplicate directory -> original directory
+        origins = {}
+        for orig_dir in stragglers:
+            job = self.jobs[orig_dir]
+            dup_dir = os.path.join(self.base_dir, SPECULATIVE_DIR, config_name, os.path.basename(orig_dir))
+            shutil.rmtree(dup_dir, ignore_errors=True)
+            # the server of the straggler is left out, it may be the slow one
+            queue.append(dataclasses.replace(
+                job, output_dir=dup_dir, cmd=job.cmd.replace(orig_dir, dup_dir)))
+            origins[dup_dir] = orig_dir
+
+        for dup in self.dispatcher.relaunch(queue):
+            orig_dir = origins[dup.output_dir]
+            self.duplicates[orig_dir] = dup
+            self.speculated.add(orig_dir)
+        return replaced
+
+    def close(self):
+        """Kill every running duplicate"""
+        self.dispatcher.kill(list(self.duplicates.values()))
+        for dup in self.duplicates.values():
+            shutil.rmtree(dup.output_dir, ignore_errors=True)
+        self.duplicates.clear()
+        self.dispatcher.close()
@@ -0,0 +1,57 @@
+import os
+import hashlib
+import shlex
+
+# Shell variable holding the checkpoint path gem5 restores from
+CPT_VAR = "CPT_LOCAL"
+
+
+def staged_name(cpt: str) -> str:
+    """Name of a checkpoint in the staging cache, unique per archive path"""
+    digest = hashlib.sha1(cpt.encode()).hexdigest()[:16]
+    return f"{digest}_{os.path.basename(cpt)}"
+
+
+def stage_cmds(cpt: str, stage_dir: str, limit_bytes: int) -> list[str]:
+    """
+    Shell commands staging a checkpoint into a server-local cache.
+
+    The first job on a server copies the checkpoint from the archive, later
+    jobs reuse the local copy. Copies are serialized per checkpoint with
+    flock, every use refreshes the copy's mtime, and copies beyond
+    [limit_bytes] are evicted least recently used first. Every job holds a
+    shared flock on the lock file of its copy, inherited by gem5, and copies
+    with a shared lock are never evicted. If staging fails the job falls
+    back to the archive path.
+
+    Args:
+        cpt: Checkpoint path in the shared archive
+        stage_dir: Cache directory on the server
+        limit_bytes: Total size of the cache
+
+    Returns:
+        Commands setting ${CPT_LOCAL} to the checkpoint path to restore from
+    """
+    local = os.path.join(stage_dir, staged_name(cpt))
+    q_dir, q_cpt, q_local = shlex.quote(stage_dir), shlex.quote(cpt), shlex.quote(local)
+    q_tmp = shlex.quote(f"{local}.tmp") + ".$$"
+
+    copy = (
+        f"( flock 9 && {{ [ -f {q_local} ] || {{ cp {q_cpt} {q_tmp} && mv {q_tmp} {q_local}; }} "
+        f"|| {{ rm -f {q_tmp}; false; }}; }} && touch {q_local} ) 9>{q_local}.lock"
+    )
+    # hold the copy until gem5 exits, the eviction may have removed it before the lock was taken
+    use = f"exec 8>>{q_local}.lock && flock -s 8 && [ -f {q_local} ]"
+    # newest first, keep copies while they fit, never evict the copy just staged or one in use;
+    # lock files stay, so a job always locks the same file as the eviction
+    evict = (
+        f"( flock -n 9 && total=0 && for f in $(ls -1t {q_dir}/*.zstd {q_dir}/*.gz 2>/dev/null); do "
+        f"total=$((total + $(stat -c %s \"$f\"))); "
+        f"if [ $total -gt {limit_bytes} ] && [ \"$f\" != {q_local} ]; then flock -xn \"$f.lock\" rm -f \"$f\"; fi; "
+        f"done ) 9>{q_dir}/.evict.lock"
+    )
+    return [
+        f"{CPT_VAR}={q_cpt}",
+        f"mkdir -p {q_dir} && {copy} && {use} && {CPT_VAR}={q_local}",
+        evict,
+    ]
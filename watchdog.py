@@ -0,0 +1,161 @@
+import os
+import time
+import threading
+from collections import deque
+from tqdm import tqdm
+
+# Load custom modules
+import checkrun
+import dispatch
+
+# Seconds a run must stay quiet after its PID is gone before it counts as hung,
+# its last writes may take a while to show up on NFS
+EXIT_GRACE = 60
+
+# Output files whose growth shows that a simulation makes progress
+PROGRESS_FILES = ("simout", "stats.txt")
+
+
+def output_signature(leaf: str) -> tuple:
+    """Size and mtime of the progress files of a leaf, None for missing files"""
+    signature = []
+    for name in PROGRESS_FILES:
+        try:
+            st = os.stat(os.path.join(leaf, name))
+            signature.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def reset_outputs(leaf: str):
+    """Clear the outputs of a killed run, keeping simout/simerr so the leaf stays running"""
+    for name in ("simout", "simerr"):
+        path = os.path.join(leaf, name)
+        if os.path.exists(path):
+            open(path, "w").close()
+    try:
+        os.remove(os.path.join(leaf, "stats.txt"))
+    except FileNotFoundError:
+        pass
+
+
+class Watchdog:
+    """
+    Kill and requeue simulations which stopped making progress
+
+    A running checkpoint is hung when neither its simout nor its stats.txt
+    changed for [stall_timeout] seconds, or when its recorded PID is gone
+    while no completion or error marker was written (e.g. the node crashed
+    or the process was OOM-killed). A hung checkpoint is killed on its
+    server and launched again on another server, at most [max_retries]
+    times. After that it is given up: a marker is appended to its simerr,
+    so it counts as an error and its configuration can finish.
+
+    Jobs are registered and polled from the issuing threads while the
+    monitor polls, every entry point holds the same lock.
+    """
+
+    def __init__(self, server_list: list[str], exec: str, max_proc_per_server: int,
+                 stall_timeout: float, max_retries: int):
+        self.stall_timeout = stall_timeout
+        self.max_retries = max_retries
+        self.dispatcher = dispatch.Dispatcher(server_list, exec, max_proc_per_server)
+        # output directory -> launched job
+        self.jobs: dict[str, dispatch.Job] = {}
+        # output directory -> (output signature, monotonic time it was first seen)
+        self.progress: dict[str, tuple[tuple, float]] = {}
+        # output directory -> number of relaunches
+        self.retries: dict[str, int] = {}
+        # killed jobs waiting for a slot on another server
+        self.pending: deque[dispatch.Job] = deque()
+        # output directory -> PID found dead
+        self.dead: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def register(self, jobs: list[dispatch.Job]):
+        """
+        Record launched jobs so they can be watched, killed and requeued.
+
+        Jobs are relaunched in place, so other holders of the same jobs see
+        their new server and PID.
+        """
+        with self._lock:
+            for job in jobs:
+                self.jobs[job.output_dir] = job
+                self.progress.pop(job.output_dir, None)
+
+    def _check_alive(self, cpt_dirs: list[str]):
+        jobs = [self.jobs[cpt_dir] for cpt_dir in cpt_dirs]
+        alive = self.dispatcher.alive(jobs)
+        for cpt_dir, job in zip(cpt_dirs, jobs):
+            if (job.server, job.pid) not in alive:
+                self.dead[cpt_dir] = job.pid
+
+    def _give_up(self, leaf: str, stalled: float):
+        with open(os.path.join(leaf, "simerr"), "a") as f:
+            f.write(f"\n{checkrun.HUNG_MARKER} after {self.max_retries} retries, "
+                    f"no output for {int(stalled)}s\n")
+        tqdm.write(f"! Gave up {checkrun.cpt_dir_of(leaf)} after {self.max_retries} retries")
+
+    def poll(self, config_name: str, checker: checkrun.RunChecker) -> bool:
+        """
+        Kill the hung checkpoints of a configuration and relaunch the killed ones.
+
+        Args:
+            config_name: Configuration name
+            checker: Checker of the configuration, right after a check()
+
+        Returns:
+            True if a checkpoint was given up and now counts as an error
+        """
+        with self._lock:
+            return self._poll(checker)
+
+    def _poll(self, checker: checkrun.RunChecker) -> bool:
+        now = time.monotonic()
+        waiting = {job.output_dir for job in self.pending}
+        running = {
+            checkrun.cpt_dir_of(leaf): leaf for leaf, state in checker.states.items()
+            if state == checkrun.RUNNING
+            and checkrun.cpt_dir_of(leaf) in self.jobs
+            and checkrun.cpt_dir_of(leaf) not in waiting
+        }
+        if running:
+            self._check_alive(list(running))
+
+        given_up = False
+        for cpt_dir, leaf in running.items():
+            signature = output_signature(leaf)
+            seen = self.progress.get(cpt_dir)
+            if seen is None or seen[0] != signature:
+                self.progress[cpt_dir] = (signature, now)
+                continue
+
+            stalled = now - seen[1]
+            job = self.jobs[cpt_dir]
+            dead = self.dead.get(cpt_dir) == job.pid and stalled >= EXIT_GRACE
+            if stalled < self.stall_timeout and not dead:
+                continue
+
+            self.dispatcher.kill([job])
+            if self.retries.get(cpt_dir, 0) >= self.max_retries:
+                self._give_up(leaf, stalled)
+                del self.jobs[cpt_dir]
+                given_up = True
+                continue
+
+            self.retries[cpt_dir] = self.retries.get(cpt_dir, 0) + 1
+            reason = "exited without result" if dead else f"no output for {int(stalled)}s"
+            tqdm.write(f"Hung on {job.server} ({reason}), requeue "
+                       f"{self.retries[cpt_dir]}/{self.max_retries}: {cpt_dir}")
+            reset_outputs(leaf)
+            self.progress.pop(cpt_dir, None)
+            self.pending.append(job)
+
+        if self.pending:
+            self.dispatcher.relaunch(self.pending)
+        return given_up
+
+    def close(self):
+        self.dispatcher.close()
@@ -0,0 +1,141 @@
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT = struct.Struct("iIII")
+
+# Files whose close-write means a checkpoint may have ended
+WATCHED_FILES = ("simout", "simerr")
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class CompletionWatcher:
+    """
+    Wait for simout/simerr close-write events under the watched directories
+
+    Backed by inotify when available, otherwise wait() simply sleeps, so
+    callers keep polling on their check interval either way. inotify only
+    sees writes made through this machine's kernel: outputs written by
+    remote servers on NFS still fall back to the polling interval.
+    """
+
+    def __init__(self, paths: list[str] = ()):
+        self._fd = None
+        self._libc = _load_libc()
+        # watch descriptor -> directory
+        self._wds: dict[int, str] = {}
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+        for path in paths:
+            self.add(path)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether events are delivered by inotify"""
+        return self._fd is not None
+
+    def _add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd >= 0:
+            self._wds[wd] = path
+
+    def add(self, path: str):
+        """Watch [path] and every directory below it"""
+        if self._fd is None:
+            return
+        for root, _, _ in os.walk(path):
+            self._add_watch(root)
+
+    def remove(self, path: str):
+        """Stop watching [path] and every directory below it"""
+        if self._fd is None:
+            return
+        prefix = path.rstrip(os.sep) + os.sep
+        for wd, watched in list(self._wds.items()):
+            if watched == path or watched.startswith(prefix):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._wds[wd]
+
+    def _read_events(self) -> set[str]:
+        dirty = set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return dirty
+
+        offset = 0
+        while offset + EVENT.size <= len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+            offset += length
+
+            if mask & IN_IGNORED:
+                self._wds.pop(wd, None)
+                continue
+
+            directory = self._wds.get(wd)
+            if directory is None:
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # new checkpoint or m5out directory, files may already be inside
+                self.add(path)
+                dirty.add(path)
+            elif mask & IN_CLOSE_WRITE and name in WATCHED_FILES:
+                dirty.add(directory)
+        return dirty
+
+    def wait(self, timeout: float) -> set[str]:
+        """
+        Block until a watched simout/simerr is closed or [timeout] elapsed.
+
+        Returns:
+            Directories with events, empty on timeout or without inotify
+        """
+        if self._fd is None:
+            time.sleep(timeout)
+            return set()
+
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return set()
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if readable:
+                dirty = self._read_events()
+                if dirty:
+                    return dirty
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._wds.clear()